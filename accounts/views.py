@@ -5,7 +5,7 @@ from django.contrib import messages
 from django.db.models import Count
 from django.http import JsonResponse
 from .models import User, Address
-from products.models import Favorite
+from products.models import Favorite, heavy_fields
 from orders.models import Order
 
 
@@ -99,7 +99,9 @@ def profile_view(request):
     # Статистика пользователя
     orders_all = Order.objects.filter(user=request.user)
     recent_orders = orders_all.prefetch_related('items__product', 'items__product__category').order_by('-created_at')[:3]
-    recent_favorites = Favorite.objects.filter(user=request.user).select_related('product', 'product__category').order_by('-added_at')[:4]
+    recent_favorites = Favorite.objects.filter(user=request.user).select_related(
+        'product', 'product__category', 'product__main_image'
+    ).defer(*heavy_fields('product__')).order_by('-added_at')[:4]
     addresses = Address.objects.filter(user=request.user)
 
     context = {
@@ -118,7 +120,9 @@ def profile_view(request):
 @login_required
 def favorites_view(request):
     """Избранные продукты"""
-    favorites = Favorite.objects.filter(user=request.user).select_related('product', 'product__category')
+    favorites = Favorite.objects.filter(user=request.user).select_related(
+        'product', 'product__category', 'product__brand', 'product__main_image'
+    ).defer(*heavy_fields('product__'))
 
     context = {
         'favorites': favorites
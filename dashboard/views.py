@@ -1,10 +1,12 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.db.models import Count, Sum, Q
+from django.db.models import Count, Sum
 from django.utils import timezone
 from accounts.models import User
-from products.models import Product, Category, ProductImage
+from products.models import Brand, Product, Category, ProductImage
+from products import popularity, search
+from products.categories import filter_by_category, get_tree
 from orders.models import Order, OrderItem, OrderStatusHistory
 
 
@@ -30,10 +32,12 @@ def dashboard_index(request):
         'items__product', 'items__product__category'
     ).order_by('-created_at')[:10]
 
-    # Популярные продукты (с наибольшим количеством заказов)
-    popular_products = Product.objects.annotate(
-        orders_count=Count('order_items')
-    ).filter(orders_count__gt=0).order_by('-orders_count')[:5]
+    # Популярные продукты - по трендовости из счётчиков просмотров и покупок
+    popular_products = list(Product.objects.filter(
+        counter__score__isnull=False
+    ).select_related('category', 'counter').for_listing().order_by('-counter__score')[:5])
+    for product in popular_products:
+        product.trending = popularity.decayed(product.counter.score)
 
     context = {
         'total_products': total_products,
@@ -165,7 +169,7 @@ def user_edit(request, pk):
 @user_passes_test(is_staff_user)
 def products_list(request):
     """Список продуктов (для менеджеров и админов)"""
-    products = Product.objects.select_related('category').prefetch_related('images').order_by('-created_at')
+    products = Product.objects.select_related('category', 'brand', 'main_image').for_listing().order_by('-created_at')
 
     # Фильтры
     category_filter = request.GET.get('category')
@@ -173,7 +177,7 @@ def products_list(request):
     search_query = request.GET.get('search', '')
 
     if category_filter:
-        products = products.filter(category__slug=category_filter)
+        products = filter_by_category(products, category_filter)
 
     if available_filter == '1':
         products = products.filter(is_available=True)
@@ -181,13 +185,9 @@ def products_list(request):
         products = products.filter(is_available=False)
 
     if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(brand__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
+        products = search.search(products, search_query)
 
-    categories = Category.objects.all()
+    categories = get_tree().nodes
 
     context = {
         'products': products,
@@ -202,14 +202,14 @@ def products_list(request):
 @user_passes_test(is_staff_user)
 def product_edit(request, pk):
     """Редактирование продукта (для менеджеров и админов)"""
-    product = get_object_or_404(Product.objects.select_related('category'), pk=pk)
-    categories = Category.objects.all()
+    product = get_object_or_404(Product.objects.select_related('category', 'brand'), pk=pk)
+    categories = get_tree().nodes
 
     if request.method == 'POST':
         category_id = request.POST.get('category')
         product.category = get_object_or_404(Category, pk=category_id)
         product.name = request.POST.get('name', product.name)
-        product.brand = request.POST.get('brand', '')
+        product.brand = Brand.for_name(request.POST.get('brand'))
         product.price = float(request.POST.get('price', product.price))
         product.quantity = float(request.POST.get('quantity', product.quantity))
         product.unit = request.POST.get('unit', product.unit)
@@ -233,6 +233,7 @@ def product_edit(request, pk):
     context = {
         'product': product,
         'categories': categories,
+        'brands': Brand.objects.only('name'),
     }
 
     return render(request, 'dashboard/product_edit.html', context)
@@ -242,7 +243,7 @@ def product_edit(request, pk):
 @user_passes_test(is_staff_user)
 def product_create(request):
     """Создание нового продукта (для менеджеров и админов)"""
-    categories = Category.objects.all()
+    categories = get_tree().nodes
 
     if request.method == 'POST':
         category_id = request.POST.get('category')
@@ -251,7 +252,7 @@ def product_create(request):
         product = Product.objects.create(
             category=category,
             name=request.POST.get('name'),
-            brand=request.POST.get('brand', ''),
+            brand=Brand.for_name(request.POST.get('brand')),
             price=float(request.POST.get('price')),
             quantity=float(request.POST.get('quantity', 1)),
             unit=request.POST.get('unit', 'pcs'),
@@ -274,6 +275,7 @@ def product_create(request):
 
     context = {
         'categories': categories,
+        'brands': Brand.objects.only('name'),
     }
 
     return render(request, 'dashboard/product_create.html', context)
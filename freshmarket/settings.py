@@ -67,6 +67,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'django.template.context_processors.media',
+                'orders.context_processors.cart',
             ],
         },
     },
@@ -128,6 +129,46 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Медиафайлы хранятся по хэшу содержимого, одинаковые загрузки - одним файлом
+# (products/storage.py; перенос старых файлов - команда convert_media_storage)
+STORAGES = {
+    'default': {
+        'BACKEND': 'products.storage.ContentAddressedStorage',
+    },
+    # Статика с хэшем содержимого в имени и gzip-копиями (freshmarket/storage.py)
+    'staticfiles': {
+        'BACKEND': 'freshmarket.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Версия каталога и другие общие счётчики хранятся в кэше: при нескольких
+# процессах-воркерах укажите общий бэкенд (Redis, Memcached или файловый)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'freshmarket',
+    }
+}
+
+# Изображения продуктов
+# Количество процессов для построения уменьшенных копий загруженных изображений
+PRODUCT_IMAGE_WORKERS = 2
+
+# Каталог
+# Движок выборки страниц каталога: 'orm' - фильтрация и сортировка в базе данных,
+# 'columnar' - по колоночной копии каталога в памяти каждого процесса (products/engine.py)
+CATALOG_ENGINE = 'orm'
+
+# Корзина
+# Хранилище корзины пользователя: 'database' - запись в базу при каждом изменении,
+# 'cache' - в общем кэше с записью в базу пачками (orders/store.py), требует
+# общего бэкенда CACHES. Корзина анонимного посетителя при 'database' хранится
+# в сессии, при 'cache' - в кэше
+CART_STORE = 'database'
+
 # Custom user model
 AUTH_USER_MODEL = 'accounts.User'
 
@@ -0,0 +1,48 @@
+"""
+Хранилище статических файлов для продакшн.
+
+collectstatic копирует файлы с хэшем содержимого в имени (css/catalog.3f2a9c.css,
+см. ManifestStaticFilesStorage), поэтому браузер может кэшировать их
+бессрочно: изменённый файл получит новое имя. Рядом с каждым текстовым
+файлом сохраняется сжатая копия .gz, которую веб-сервер отдаёт без сжатия
+на лету (в nginx - директива gzip_static).
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+
+# Файлы меньше этого размера сжимать бессмысленно
+MIN_COMPRESS_SIZE = 256
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Файлы с хэшем в имени и их gzip-копии"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        for name in list(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                compressed = self._compress(name)
+                if compressed:
+                    yield name, compressed, True
+
+    def _compress(self, name):
+        """Сохранить name.gz, если сжатие уменьшает файл"""
+        with self.open(name) as file:
+            content = file.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return None
+
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) >= len(content):
+            return None
+
+        compressed_name = f'{name}.gz'
+        with open(self.path(compressed_name), 'wb') as file:
+            file.write(compressed)
+        return compressed_name
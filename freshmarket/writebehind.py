@@ -0,0 +1,81 @@
+"""
+Отложенная запись (write-behind) изменений, накопленных в памяти процесса.
+
+Модуль держит свой буфер изменений (счётчики, множество id...) и меняет
+его под lock, после чего вызывает added(). Функция flush модуля забирает
+буфер под lock, вызывая там же taken(), и записывает его в базу; если
+запись не удалась, возвращает буфер обратно и вызывает failed().
+
+flush вызывается:
+- сразу, если накопилось max_events изменений или с прошлой записи прошло
+  interval секунд;
+- по таймеру через interval секунд после первого изменения (фоновый
+  поток), так что изменения записываются, даже если новых больше нет;
+- при завершении процесса.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehind:
+    """Расписание записи буфера одного модуля"""
+
+    def __init__(self, flush, interval, max_events, description):
+        self.lock = threading.Lock()
+        self.interval = interval
+        self.max_events = max_events
+        # Для сообщений в журнале: «счётчики популярности», «корзины»...
+        self.description = description
+        self._flush = flush
+        self._events = 0
+        self._last_flush = time.monotonic()
+        self._timer = None
+        atexit.register(self._flush_on_exit)
+
+    def added(self, count=1):
+        """Учесть изменения, уже внесённые в буфер; записать его, если пора"""
+        with self.lock:
+            self._events += count
+            due = self._events >= self.max_events or time.monotonic() - self._last_flush >= self.interval
+            if not due:
+                self._schedule()
+        if due:
+            self._flush()
+
+    def taken(self):
+        """Буфер забран на запись (вызывается под lock)"""
+        self._events = 0
+        self._last_flush = time.monotonic()
+
+    def failed(self):
+        """Запись не удалась, буфер возвращён - повторить позже (вызывается под lock)"""
+        self._schedule()
+
+    def _schedule(self):
+        if self._timer is None:
+            self._timer = threading.Timer(self.interval, self._flush_on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_on_timer(self):
+        with self.lock:
+            self._timer = None
+        try:
+            self._flush()
+        except Exception:
+            logger.exception('Не удалось записать %s', self.description)
+        finally:
+            # Соединения с базой открыты в потоке таймера
+            connections.close_all()
+
+    def _flush_on_exit(self):
+        try:
+            self._flush()
+        except Exception:
+            logger.exception('Не удалось записать %s при завершении', self.description)
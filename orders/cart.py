@@ -0,0 +1,117 @@
+"""
+Итоги корзины.
+
+Количество товаров и сумма корзины нужны странице корзины, оформлению
+заказа и ответам AJAX. Раньше каждое обращение к Cart.total_price
+перебирало позиции с отдельным запросом продукта на каждую; теперь итоги
+считаются один раз за запрос - одним агрегирующим запросом (summarize)
+или по уже загруженным позициям (from_items) - и передаются дальше
+объектом CartSummary.
+
+Значку корзины в шапке нужно только количество товаров, и оно выводится
+на каждой странице. Количество хранится в кэше под ключом пользователя
+(get_cart_count); представления корзины записывают в кэш новое значение
+после каждого изменения (remember_cart_count).
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import DecimalField, F, IntegerField, Sum, Value
+from django.db.models.functions import Coalesce
+
+# Минимальная сумма заказа и стоимость доставки, ₽
+MIN_ORDER_TOTAL = Decimal('500')
+DELIVERY_PRICE = Decimal('99')
+
+CENT = Decimal('0.01')
+
+# Страховка на случай изменений корзины в обход представлений (админка)
+CART_COUNT_TIMEOUT = 600
+
+
+class CartSummary:
+    """Количество товаров и сумма корзины"""
+
+    def __init__(self, total_items=0, total_price=Decimal('0')):
+        self.total_items = total_items
+        self.total_price = total_price
+
+    @classmethod
+    def from_items(cls, items):
+        """Итоги по загруженным позициям (с продуктами) без запросов"""
+        items = list(items)
+        return cls(
+            sum(item.quantity for item in items),
+            sum((item.total_price for item in items), Decimal('0')),
+        )
+
+    @property
+    def meets_minimum(self):
+        """Достаточна ли сумма для оформления заказа"""
+        return self.total_price >= MIN_ORDER_TOTAL
+
+    @property
+    def delivery_price(self):
+        return DELIVERY_PRICE if self.meets_minimum else Decimal('0')
+
+    @property
+    def final_total(self):
+        """Итоговая сумма с доставкой"""
+        return self.total_price + self.delivery_price
+
+    @property
+    def remaining(self):
+        """Сколько не хватает до минимальной суммы заказа"""
+        return max(MIN_ORDER_TOTAL - self.total_price, Decimal('0'))
+
+    @property
+    def progress_percent(self):
+        """Заполненность до минимальной суммы, %"""
+        return min(int(self.total_price * 100 / MIN_ORDER_TOTAL), 100)
+
+    def as_json(self):
+        """Поля итогов для ответов AJAX"""
+        return {
+            'cart_total': float(self.total_price),
+            'cart_items_count': self.total_items,
+            'cart_final_total': float(self.final_total),
+            'meets_minimum': self.meets_minimum,
+        }
+
+
+def summarize(cart):
+    """Итоги корзины одним агрегирующим запросом"""
+    if cart is None or cart.pk is None:
+        return CartSummary()
+    totals = cart.items.aggregate(
+        total_items=Coalesce(Sum('quantity'), Value(0), output_field=IntegerField()),
+        total_price=Coalesce(
+            Sum(F('quantity') * F('product__price'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    )
+    # SQLite суммирует DECIMAL как число с плавающей точкой
+    return CartSummary(totals['total_items'], totals['total_price'].quantize(CENT))
+
+
+def _count_key(user_id):
+    return f'cart:count:{user_id}'
+
+
+def get_cart_count(user):
+    """Количество товаров в корзине пользователя из кэша"""
+    count = cache.get(_count_key(user.pk))
+    if count is None:
+        from .models import CartItem
+
+        count = CartItem.objects.filter(cart__user_id=user.pk).aggregate(
+            total=Coalesce(Sum('quantity'), Value(0), output_field=IntegerField())
+        )['total']
+        cache.set(_count_key(user.pk), count, CART_COUNT_TIMEOUT)
+    return count
+
+
+def remember_cart_count(user_id, count):
+    """Записать в кэш количество товаров после изменения корзины"""
+    cache.set(_count_key(user_id), count, CART_COUNT_TIMEOUT)
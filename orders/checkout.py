@@ -0,0 +1,95 @@
+"""
+Оформление заказа.
+
+Заказ создаётся одной транзакцией с постоянным числом запросов,
+независимо от размера корзины:
+
+1. остатки всех продуктов уменьшаются одним условным UPDATE
+   (stock = stock - количество там, где stock >= количества); если
+   обновлено меньше строк, чем позиций, какого-то товара не хватает -
+   транзакция откатывается и заказ отклоняется (OutOfStock);
+2. цены читаются после UPDATE: строки продуктов уже заблокированы
+   транзакцией, поэтому цена в заказе - та, по которой списан остаток;
+3. заказ и его позиции (bulk_create).
+
+Параллельные оформления не могут продать больше остатка: условие
+stock >= количества проверяет сама база при обновлении строки.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, When
+from django.utils import timezone
+
+from products.cache import invalidate, product_namespace
+from products.models import Product
+
+from .cart import DELIVERY_PRICE
+from .models import Order, OrderItem
+
+
+class OutOfStock(Exception):
+    """Остатка не хватает для части позиций корзины"""
+
+    def __init__(self, shortages):
+        # [(позиция корзины, доступное количество)]
+        self.shortages = shortages
+        super().__init__(', '.join(f'{item.product.name}: {available}' for item, available in shortages))
+
+
+def _shortages(items):
+    """Позиции, для которых не хватает остатка, и доступное количество"""
+    available = dict(
+        Product.objects.filter(pk__in=[item.product_id for item in items], is_available=True)
+        .values_list('pk', 'stock')
+    )
+    return [
+        (item, max(available.get(item.product_id, 0), 0))
+        for item in items if item.quantity > available.get(item.product_id, 0)
+    ]
+
+
+def place_order(user, items, **fields):
+    """
+    Создать заказ из позиций корзины (CartItem с продуктами) и списать
+    остатки. fields - поля заказа (адрес, оплата, время доставки...).
+    """
+    quantities = {item.product_id: item.quantity for item in items}
+    if not quantities:
+        raise ValueError('Корзина пуста')
+
+    with transaction.atomic():
+        in_stock = Q()
+        for product_id, quantity in quantities.items():
+            in_stock |= Q(pk=product_id, stock__gte=quantity)
+        updated = Product.objects.filter(in_stock, is_available=True).update(
+            stock=Case(
+                *[When(pk=product_id, then=F('stock') - quantity) for product_id, quantity in quantities.items()],
+                output_field=IntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+        if updated != len(quantities):
+            transaction.set_rollback(True)
+            order = None
+        else:
+            prices = dict(Product.objects.filter(pk__in=quantities).values_list('pk', 'price'))
+            order = Order.objects.create(
+                user=user,
+                total_price=sum((prices[pk] * quantity for pk, quantity in quantities.items()), Decimal('0')),
+                delivery_price=DELIVERY_PRICE,
+                **fields,
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_id=pk, quantity=quantity, price=prices[pk])
+                for pk, quantity in quantities.items()
+            ])
+
+    if order is None:
+        # Транзакция откатилась - актуальные остатки для сообщения читаются заново
+        raise OutOfStock(_shortages(items))
+
+    # UPDATE не вызывает сигналов продуктов. Остатки выводятся только на
+    # страницах самих продуктов - версия каталога (списки) не меняется
+    transaction.on_commit(lambda: invalidate(*(product_namespace(pk) for pk in quantities)))
+    return order
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Бэкенды кэша, не общие для процессов сервера
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_cart_store(app_configs, **kwargs):
+    """
+    CART_STORE = 'cache' требует общего кэша: с locmem у каждого процесса
+    своя копия корзины, и при записи пачкой процессы затирают в базе
+    изменения друг друга
+    """
+    if settings.CART_STORE != 'cache' or settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS:
+        return []
+    return [Error(
+        "CART_STORE = 'cache' требует общего для всех процессов кэша",
+        hint="Укажите в CACHES['default'] Redis, Memcached или файловый кэш либо CART_STORE = 'database'",
+        id='orders.E001',
+    )]
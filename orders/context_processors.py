@@ -0,0 +1,8 @@
+from .store import get_store
+
+
+def cart(request):
+    """Количество товаров в корзине для значка в шапке"""
+    if not hasattr(request, 'user'):
+        return {'cart_items_count': 0}
+    return {'cart_items_count': get_store(request).count()}
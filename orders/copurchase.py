@@ -0,0 +1,146 @@
+"""
+«Часто покупают вместе» по истории заказов.
+
+Матрица совместных покупок товар × товар накапливается в разреженном
+виде: пара (a, b) кодируется одним int64-ключом a * M + b, где M больше
+любого id продукта. Позиции заказов читаются потоком, пачками по целым
+заказам; для каждой пачки пары считаются векторно (np.unique по ключам)
+и сливаются с уже накопленными. В памяти одновременно находятся только
+одна пачка строк и уникальные пары, а не вся таблица OrderItem.
+
+Для каждого продукта сохраняются top-K соседей в CoPurchase.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+
+from products.models import Product, heavy_fields
+from .models import CoPurchase, OrderItem
+
+TOP_K = 8
+MIN_COUNT = 2
+CHUNK_SIZE = 50000
+SAVE_BATCH_SIZE = 2000
+
+
+def _order_pairs(order_ids, product_ids, modulus):
+    """Ключи пар (a, b), a != b, для товаров внутри каждого заказа пачки"""
+    # Повторная покупка товара в заказе считается один раз
+    unique = np.unique(np.stack([order_ids, product_ids]), axis=1)
+    orders, products = unique[0], unique[1]
+    if not len(orders):
+        return np.empty(0, dtype=np.int64)
+
+    # Границы заказов в отсортированном массиве
+    starts = np.flatnonzero(np.concatenate(([True], orders[1:] != orders[:-1])))
+    sizes = np.diff(np.concatenate((starts, [len(orders)])))
+    item_start = np.repeat(starts, sizes)
+    item_size = np.repeat(sizes, sizes)
+
+    # Каждый товар заказа в паре со всеми товарами того же заказа
+    left = np.repeat(np.arange(len(orders)), item_size)
+    offsets = np.arange(item_size.sum()) - np.repeat(np.cumsum(item_size) - item_size, item_size)
+    right = np.repeat(item_start, item_size) + offsets
+
+    mask = left != right
+    return products[left[mask]] * modulus + products[right[mask]]
+
+
+def _merge(keys, counts, new_keys, new_counts):
+    """Сложить два разреженных набора счётчиков"""
+    all_keys = np.concatenate((keys, new_keys))
+    all_counts = np.concatenate((counts, new_counts))
+    merged, inverse = np.unique(all_keys, return_inverse=True)
+    return merged, np.bincount(inverse, weights=all_counts).astype(np.int64)
+
+
+def count_pairs(chunk_size=CHUNK_SIZE):
+    """
+    Счётчики совместных покупок по всем заказам, кроме отменённых.
+    Возвращает (a, b, count) - массивы NumPy.
+    """
+    max_id = Product.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+    modulus = max_id + 1
+
+    keys = np.empty(0, dtype=np.int64)
+    counts = np.empty(0, dtype=np.int64)
+
+    rows = OrderItem.objects.exclude(order__status='cancelled').order_by(
+        'order_id'
+    ).values_list('order_id', 'product_id').iterator(chunk_size=chunk_size)
+
+    def flush(buffer):
+        nonlocal keys, counts
+        data = np.asarray(buffer, dtype=np.int64)
+        pair_keys, pair_counts = np.unique(_order_pairs(data[:, 0], data[:, 1], modulus), return_counts=True)
+        keys, counts = _merge(keys, counts, pair_keys, pair_counts)
+
+    buffer = []
+    for order_id, product_id in rows:
+        # Пачка заканчивается только на границе заказа
+        if len(buffer) >= chunk_size and buffer[-1][0] != order_id:
+            flush(buffer)
+            buffer = []
+        buffer.append((order_id, product_id))
+    if buffer:
+        flush(buffer)
+
+    return keys // modulus, keys % modulus, counts
+
+
+def top_pairs(a, b, counts, top_k=TOP_K, min_count=MIN_COUNT):
+    """Top-K пар для каждого продукта: массивы (a, b, count, rank)"""
+    keep = counts >= min_count
+    a, b, counts = a[keep], b[keep], counts[keep]
+
+    # По продукту, затем по убыванию счётчика, затем по id соседа
+    order = np.lexsort((b, -counts, a))
+    a, b, counts = a[order], b[order], counts[order]
+
+    starts = np.flatnonzero(np.concatenate(([True], a[1:] != a[:-1]))) if len(a) else np.empty(0, dtype=np.int64)
+    sizes = np.diff(np.concatenate((starts, [len(a)])))
+    rank = np.arange(len(a)) - np.repeat(starts, sizes)
+
+    keep = rank < top_k
+    return a[keep], b[keep], counts[keep], rank[keep]
+
+
+def rebuild(top_k=TOP_K, min_count=MIN_COUNT, chunk_size=CHUNK_SIZE):
+    """Пересчитать таблицу CoPurchase. Возвращает количество сохранённых пар"""
+    a, b, counts, rank = top_pairs(*count_pairs(chunk_size), top_k=top_k, min_count=min_count)
+
+    with transaction.atomic():
+        CoPurchase.objects.all().delete()
+        for start in range(0, len(a), SAVE_BATCH_SIZE):
+            end = start + SAVE_BATCH_SIZE
+            CoPurchase.objects.bulk_create([
+                CoPurchase(product_id=int(x), other_id=int(y), count=int(n), rank=int(r))
+                for x, y, n, r in zip(a[start:end], b[start:end], counts[start:end], rank[start:end])
+            ])
+    return len(a)
+
+
+def recommendations(product_ids, limit=4):
+    """
+    Товары, которые часто покупают вместе с product_ids (одним запросом).
+    Сами product_ids и недоступные товары исключаются.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return []
+
+    links = CoPurchase.objects.filter(
+        product_id__in=product_ids,
+        other__is_available=True
+    ).exclude(
+        other_id__in=product_ids
+    ).select_related(
+        'other__category', 'other__main_image'
+    ).defer(*heavy_fields('other__')).order_by('-count', 'rank')
+
+    result = {}
+    for link in links:
+        result.setdefault(link.other_id, link.other)
+        if len(result) >= limit:
+            break
+    return list(result.values())
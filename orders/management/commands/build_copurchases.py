@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders import copurchase
+
+
+class Command(BaseCommand):
+    help = 'Расчёт товаров, которые часто покупают вместе, по истории заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=copurchase.TOP_K, help='Количество пар на продукт')
+        parser.add_argument('--min-count', type=int, default=copurchase.MIN_COUNT,
+                            help='Минимальное количество совместных заказов')
+        parser.add_argument('--chunk-size', type=int, default=copurchase.CHUNK_SIZE,
+                            help='Количество позиций заказов в одной пачке')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = copurchase.rebuild(
+            top_k=options['top_k'],
+            min_count=options['min_count'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Сохранено пар: {total} за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from orders.models import OrderItem
+from products import popularity
+
+
+class Command(BaseCommand):
+    help = 'Заполнение счётчиков популярности покупками из истории заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Количество позиций заказов в одной пачке')
+
+    def handle(self, *args, **options):
+        # Покупка учитывается один раз на позицию заказа, как в record_purchases
+        purchases = OrderItem.objects.exclude(order__status='cancelled').values_list(
+            'product_id', 'order__created_at'
+        ).iterator(chunk_size=options['chunk_size'])
+        total = popularity.seed(purchases)
+        self.stdout.write(self.style.SUCCESS(f'Заполнено счётчиков продуктов: {total}'))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_cart_cartitem'),
+        ('products', '0005_similarproduct'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoPurchase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(verbose_name='Количество совместных заказов')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Позиция')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product', verbose_name='Покупают вместе')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='copurchases', to='products.product', verbose_name='Продукт')),
+            ],
+            options={
+                'verbose_name': 'Совместная покупка',
+                'verbose_name_plural': 'Совместные покупки',
+                'ordering': ['product', 'rank'],
+                'indexes': [models.Index(fields=['product', 'rank'], name='orders_copu_product_4d40d0_idx')],
+                'unique_together': {('product', 'other')},
+            },
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.conf import settings
 from products.models import Product
 
+from .cart import summarize
+
 
 class Order(models.Model):
     """Модель заказа на доставку продуктов"""
@@ -169,15 +171,19 @@ class Cart(models.Model):
     def __str__(self):
         return f"Корзина {self.user.email}"
 
+    def summary(self):
+        """Итоги корзины одним запросом (orders/cart.py)"""
+        return summarize(self)
+
     @property
     def total_price(self):
         """Общая стоимость товаров в корзине"""
-        return sum(item.total_price for item in self.items.all())
+        return self.summary().total_price
 
     @property
     def total_items(self):
         """Общее количество товаров в корзине"""
-        return sum(item.quantity for item in self.items.all())
+        return self.summary().total_items
 
 
 class CartItem(models.Model):
@@ -209,3 +215,33 @@ class CartItem(models.Model):
     def total_price(self):
         """Общая стоимость позиции"""
         return self.product.price * self.quantity
+
+
+class CoPurchase(models.Model):
+    """Товар, который часто покупают вместе с продуктом (см. orders/copurchase.py)"""
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='copurchases',
+        verbose_name='Продукт'
+    )
+    other = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Покупают вместе'
+    )
+    count = models.PositiveIntegerField('Количество совместных заказов')
+    rank = models.PositiveSmallIntegerField('Позиция')
+
+    class Meta:
+        verbose_name = 'Совместная покупка'
+        verbose_name_plural = 'Совместные покупки'
+        ordering = ['product', 'rank']
+        unique_together = ['product', 'other']
+        indexes = [
+            models.Index(fields=['product', 'rank']),
+        ]
+
+    def __str__(self):
+        return f"{self.product} + {self.other} ({self.count})"
@@ -0,0 +1,11 @@
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from .store import merge_session_cart
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    """Добавить корзину, собранную до входа, к корзине пользователя"""
+    if request is not None and hasattr(request, 'session'):
+        merge_session_cart(request, user)
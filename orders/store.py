@@ -0,0 +1,371 @@
+"""
+Хранилища корзины.
+
+Корзина - это позиции {id продукта: количество} в порядке добавления.
+Представления корзины работают с ней через хранилище, выбранное
+настройкой CART_STORE:
+
+- 'database' - таблицы Cart/CartItem, каждое изменение - запись в базу;
+- 'cache' - живая корзина хранится в общем кэше Django (CACHES: Redis,
+  Memcached, файлы; не locmem - см. orders/checks.py), а в базу
+  записывается пачкой (write-behind): изменённые
+  корзины копятся в памяти процесса и сохраняются раз в FLUSH_INTERVAL
+  секунд или после FLUSH_EVENTS изменений, остаток - при завершении
+  процесса; первое изменение после записи заводит таймер, так что
+  корзина сохраняется, даже если новых изменений больше нет
+  (см. freshmarket/writebehind.py). При промахе кэша корзина читается
+  из базы.
+
+Корзина анонимного посетителя в таблицы не попадает (там корзина
+привязана к пользователю): при CART_STORE = 'database' она хранится
+в самой сессии, при 'cache' - в кэше под случайным токеном из сессии.
+При входе она добавляется к корзине пользователя (merge_session_cart).
+
+Изменения, записанные в кэш, но не сохранённые в базу, теряются, если
+кэш вытеснит корзину раньше сброса, - поэтому таймаут живой корзины
+намного больше интервала сброса.
+"""
+import logging
+import secrets
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from freshmarket.writebehind import WriteBehind
+from products.models import Product, heavy_fields
+
+from .cart import get_cart_count, remember_cart_count
+from .models import Cart, CartItem
+
+logger = logging.getLogger(__name__)
+
+# Ключ токена анонимной корзины в сессии (CART_STORE = 'cache')
+SESSION_KEY = 'cart_token'
+# Ключ позиций анонимной корзины в сессии (CART_STORE = 'database')
+SESSION_CART_KEY = 'cart'
+
+USER_CART_TIMEOUT = 7 * 86400
+SESSION_CART_TIMEOUT = 30 * 86400
+
+FLUSH_INTERVAL = 30
+FLUSH_EVENTS = 200
+
+ITEM_RELATED = ['product', 'product__category', 'product__brand', 'product__main_image']
+
+
+def _load_items(lines):
+    """Несохранённые CartItem с продуктами для позиций {id продукта: количество}"""
+    products = Product.objects.select_related('category', 'brand', 'main_image').for_listing().in_bulk(list(lines))
+    # Продукт могли удалить, пока он лежал в корзине
+    return [
+        CartItem(product=products[product_id], quantity=quantity)
+        for product_id, quantity in lines.items() if product_id in products
+    ]
+
+
+def _apply_quantities(lines, quantities):
+    """Позиции после установки количеств (см. CartStore.apply)"""
+    for product_id, quantity in quantities.items():
+        if quantity <= 0:
+            lines.pop(product_id, None)
+        else:
+            lines[product_id] = quantity
+    return lines
+
+
+def _upsert_items(items):
+    """Вставить позиции или обновить количество уже существующих - одним запросом"""
+    if items:
+        CartItem.objects.bulk_create(
+            items,
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity'],
+        )
+
+
+class CartStore(ABC):
+    """Корзина одного владельца"""
+
+    @abstractmethod
+    def lines(self):
+        """Позиции {id продукта: количество} в порядке добавления"""
+
+    def items(self):
+        """Позиции с продуктами (CartItem) для страниц и итогов"""
+        return _load_items(self.lines())
+
+    @abstractmethod
+    def apply(self, quantities):
+        """Установить количества {id продукта: количество}; 0 и меньше - убрать из корзины"""
+
+    def set_quantity(self, product_id, quantity):
+        self.apply({product_id: quantity})
+
+    @abstractmethod
+    def clear(self):
+        """Убрать все позиции"""
+
+    def count(self):
+        """Количество товаров для значка в шапке"""
+        return sum(self.lines().values())
+
+    def remember_count(self, count):
+        """Запомнить количество товаров после изменения корзины"""
+
+
+class DatabaseCartStore(CartStore):
+    """Корзина пользователя в таблицах Cart/CartItem"""
+
+    def __init__(self, user):
+        self.user = user
+
+    def _items(self):
+        return CartItem.objects.filter(cart__user=self.user).order_by('added_at', 'pk')
+
+    def lines(self):
+        return dict(self._items().values_list('product_id', 'quantity'))
+
+    def items(self):
+        return list(self._items().select_related(*ITEM_RELATED).defer(*heavy_fields('product__')))
+
+    def apply(self, quantities):
+        removed = [product_id for product_id, quantity in quantities.items() if quantity <= 0]
+        with transaction.atomic():
+            cart, created = Cart.objects.get_or_create(user=self.user)
+            if removed:
+                CartItem.objects.filter(cart=cart, product_id__in=removed).delete()
+            _upsert_items([
+                CartItem(cart=cart, product_id=product_id, quantity=quantity)
+                for product_id, quantity in quantities.items() if quantity > 0
+            ])
+
+    def clear(self):
+        CartItem.objects.filter(cart__user=self.user).delete()
+        self.remember_count(0)
+
+    def count(self):
+        return get_cart_count(self.user)
+
+    def remember_count(self, count):
+        remember_cart_count(self.user.pk, count)
+
+
+class CacheCartStore(CartStore):
+    """
+    Корзина в общем кэше. Корзина пользователя сохраняется в базу пачкой
+    (flush) и читается из неё при промахе; корзина с user=None -
+    анонимная, только в кэше.
+    """
+
+    def __init__(self, user=None, token=None):
+        self.user = user
+        self.token = token
+
+    @property
+    def key(self):
+        if self.user is not None:
+            return f'cart:user:{self.user.pk}'
+        return f'cart:session:{self.token}'
+
+    @property
+    def timeout(self):
+        return USER_CART_TIMEOUT if self.user is not None else SESSION_CART_TIMEOUT
+
+    @property
+    def has_owner(self):
+        """Есть ли владелец: у анонимного посетителя без токена корзины нет"""
+        return self.user is not None or self.token is not None
+
+    def lines(self):
+        if not self.has_owner:
+            return {}
+        lines = cache.get(self.key)
+        if lines is None:
+            lines = DatabaseCartStore(self.user).lines() if self.user is not None else {}
+            cache.set(self.key, lines, self.timeout)
+        return lines
+
+    def _save(self, lines):
+        if not self.has_owner:
+            return
+        cache.set(self.key, lines, self.timeout)
+        if self.user is not None:
+            _mark_dirty(self.user.pk)
+
+    def apply(self, quantities):
+        self._save(_apply_quantities(self.lines(), quantities))
+
+    def clear(self):
+        self._save({})
+
+    def delete(self):
+        """Удалить анонимную корзину из кэша"""
+        if self.has_owner:
+            cache.delete(self.key)
+
+
+class SessionCartStore(CartStore):
+    """
+    Корзина анонимного посетителя в его сессии. Сессии хранятся в базе и
+    видны всем процессам сервера, в отличие от locmem-кэша.
+    """
+
+    def __init__(self, session):
+        # None - у запроса нет сессии
+        self.session = session
+
+    def lines(self):
+        if self.session is None:
+            return {}
+        # Сессия сериализуется в JSON, где ключи словаря - строки,
+        # поэтому позиции хранятся списком пар
+        return dict(self.session.get(SESSION_CART_KEY, []))
+
+    def _save(self, lines):
+        if self.session is not None:
+            self.session[SESSION_CART_KEY] = list(lines.items())
+
+    def apply(self, quantities):
+        self._save(_apply_quantities(self.lines(), quantities))
+
+    def clear(self):
+        self._save({})
+
+    def delete(self):
+        """Удалить корзину из сессии"""
+        if self.session is not None:
+            self.session.pop(SESSION_CART_KEY, None)
+
+
+def user_store(user):
+    """Хранилище корзины пользователя по настройке CART_STORE"""
+    if settings.CART_STORE == 'cache':
+        return CacheCartStore(user)
+    return DatabaseCartStore(user)
+
+
+def _session_store(request, create=False):
+    """
+    Хранилище корзины анонимного посетителя по настройке CART_STORE;
+    create - выдать токен кэш-корзины, если его ещё нет
+    """
+    if settings.CART_STORE == 'cache':
+        return CacheCartStore(token=_session_token(request, create))
+    return SessionCartStore(getattr(request, 'session', None))
+
+
+def get_store(request):
+    """Хранилище корзины текущего посетителя"""
+    if request.user.is_authenticated:
+        return user_store(request.user)
+    return _session_store(request)
+
+
+def _session_token(request, create=False):
+    """Токен анонимной корзины из сессии; None, если сессии у запроса нет"""
+    session = getattr(request, 'session', None)
+    if session is None:
+        return None
+    token = session.get(SESSION_KEY)
+    if token is None and create:
+        token = session[SESSION_KEY] = secrets.token_urlsafe(16)
+    return token
+
+
+def get_writable_store(request):
+    """Хранилище для изменения корзины: анонимному посетителю выдаётся токен кэш-корзины"""
+    if not request.user.is_authenticated:
+        return _session_store(request, create=True)
+    return get_store(request)
+
+
+def has_session_cart(request):
+    """Есть ли у анонимного посетителя корзина"""
+    if request.user.is_authenticated:
+        return False
+    session = getattr(request, 'session', None)
+    return session is not None and (SESSION_KEY in session or SESSION_CART_KEY in session)
+
+
+def merge_session_cart(request, user):
+    """Добавить корзину анонимного посетителя к корзине вошедшего пользователя"""
+    session_cart = _session_store(request)
+    lines = session_cart.lines()
+    session_cart.delete()
+    request.session.pop(SESSION_KEY, None)
+    if not lines:
+        return
+
+    store = user_store(user)
+    current = store.lines()
+    stock = dict(Product.objects.filter(pk__in=lines, is_available=True).values_list('pk', 'stock'))
+    store.apply({
+        product_id: min(current.get(product_id, 0) + quantity, stock[product_id])
+        for product_id, quantity in lines.items() if product_id in stock
+    })
+    store.remember_count(sum(store.lines().values()))
+
+
+_dirty = set()
+
+
+def _mark_dirty(user_id):
+    with _buffer.lock:
+        _dirty.add(user_id)
+    _buffer.added()
+
+
+def flush():
+    """Сохранить изменённые корзины из кэша в базу. Возвращает количество корзин"""
+    global _dirty
+    with _buffer.lock:
+        dirty = _dirty
+        _dirty = set()
+        _buffer.taken()
+
+    if not dirty:
+        return 0
+
+    keys = {f'cart:user:{user_id}': user_id for user_id in dirty}
+    # Корзина, которую вытеснили из кэша, не сохраняется: в базе остаётся прежняя
+    carts = {keys[key]: lines for key, lines in cache.get_many(list(keys)).items()}
+    if not carts:
+        return 0
+
+    try:
+        with transaction.atomic():
+            Cart.objects.bulk_create([Cart(user_id=user_id) for user_id in carts], ignore_conflicts=True)
+            cart_ids = dict(Cart.objects.filter(user_id__in=carts).values_list('user_id', 'pk'))
+            Cart.objects.filter(pk__in=cart_ids.values()).update(updated_at=timezone.now())
+
+            # Позиции, которых больше нет в корзине, - одним DELETE
+            removed = Q()
+            for user_id, lines in carts.items():
+                removed |= Q(cart_id=cart_ids[user_id]) & ~Q(product_id__in=list(lines))
+            CartItem.objects.filter(removed).delete()
+
+            product_ids = set().union(*carts.values())
+            existing = set(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
+            _upsert_items([
+                CartItem(cart_id=cart_ids[user_id], product_id=product_id, quantity=quantity)
+                for user_id, lines in carts.items()
+                for product_id, quantity in lines.items() if product_id in existing
+            ])
+    except DatabaseError:
+        logger.exception('Не удалось сохранить корзины')
+        # Вернуть корзины в очередь до следующей попытки
+        with _buffer.lock:
+            _dirty.update(carts)
+            _buffer.failed()
+        return 0
+
+    return len(carts)
+
+
+_buffer = WriteBehind(flush, FLUSH_INTERVAL, FLUSH_EVENTS, 'корзины')
+
@@ -7,8 +7,9 @@ urlpatterns = [
     # Корзина
     path('cart/', views.cart_view, name='cart'),
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
-    path('cart/update/<int:item_id>/', views.update_cart_item, name='update_cart_item'),
-    path('cart/remove/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
+    path('cart/update/<int:product_id>/', views.update_cart_item, name='update_cart_item'),
+    path('cart/remove/<int:product_id>/', views.remove_from_cart, name='remove_from_cart'),
+    path('cart/batch/', views.update_cart, name='update_cart'),
     path('cart/clear/', views.clear_cart, name='clear_cart'),
 
     # Оформление заказа
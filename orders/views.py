@@ -1,33 +1,56 @@
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.db.models import F
 from django.utils import timezone
-from .models import Cart, CartItem, Order, OrderItem
+from django.views.decorators.http import require_POST
+from .cart import MIN_ORDER_TOTAL, CartSummary
+from .checkout import OutOfStock, place_order
+from .copurchase import recommendations
+from .store import get_store, get_writable_store
 from products.models import Product
+from products import popularity
 from accounts.models import Address
 
 
-@login_required
 def cart_view(request):
     """Просмотр корзины"""
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.select_related('product', 'product__category').all()
+    cart_items = get_store(request).items()
+
+    # Часто покупают вместе с товарами корзины
+    recommended_products = recommendations([item.product_id for item in cart_items])
 
     context = {
-        'cart': cart,
         'cart_items': cart_items,
+        'summary': CartSummary.from_items(cart_items),
+        'recommended_products': recommended_products,
     }
     return render(request, 'orders/cart.html', context)
 
 
-@login_required
+def _cart_changed(store):
+    """Итоги корзины после изменения; количество товаров - в кэш для значка в шапке"""
+    summary = CartSummary.from_items(store.items())
+    store.remember_count(summary.total_items)
+    return summary
+
+
+def _cart_item(store, product_id):
+    """Позиция корзины с продуктом или 404"""
+    for item in store.items():
+        if item.product_id == product_id:
+            return item
+    raise Http404('Товара нет в корзине')
+
+
 def add_to_cart(request, product_id):
     """Добавление товара в корзину"""
     if request.method == 'POST':
         product = get_object_or_404(Product, id=product_id)
-        cart, created = Cart.objects.get_or_create(user=request.user)
+        store = get_writable_store(request)
 
         quantity = int(request.POST.get('quantity', 1))
 
@@ -36,31 +59,22 @@ def add_to_cart(request, product_id):
             messages.error(request, f'К сожалению, доступно только {product.stock} шт.')
             return redirect(request.META.get('HTTP_REFERER', 'products:catalog'))
 
-        # Добавление или обновление товара в корзине
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            defaults={'quantity': quantity}
-        )
-
-        if not created:
-            # Если товар уже в корзине, увеличиваем количество
-            new_quantity = cart_item.quantity + quantity
-            if new_quantity > product.stock:
-                messages.error(request, f'Максимальное количество: {product.stock} шт.')
-            else:
-                cart_item.quantity = new_quantity
-                cart_item.save()
-                messages.success(request, f'{product.name} добавлен в корзину')
+        # Если товар уже в корзине, увеличиваем количество
+        current = store.lines().get(product.pk, 0)
+        if current + quantity > product.stock:
+            messages.error(request, f'Максимальное количество: {product.stock} шт.')
         else:
+            store.set_quantity(product.pk, current + quantity)
             messages.success(request, f'{product.name} добавлен в корзину')
 
+        summary = _cart_changed(store)
+
         # Если AJAX запрос
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return JsonResponse({
                 'success': True,
-                'cart_total': cart.total_items,
-                'message': f'{product.name} добавлен в корзину'
+                'message': f'{product.name} добавлен в корзину',
+                **summary.as_json(),
             })
 
         return redirect(request.META.get('HTTP_REFERER', 'products:catalog'))
@@ -68,60 +82,135 @@ def add_to_cart(request, product_id):
     return redirect('products:catalog')
 
 
-@login_required
-def update_cart_item(request, item_id):
+def update_cart_item(request, product_id):
     """Обновление количества товара в корзине"""
     if request.method == 'POST':
-        cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
+        store = get_store(request)
+        cart_item = _cart_item(store, product_id)
         quantity = int(request.POST.get('quantity', 1))
 
         if quantity <= 0:
-            cart_item.delete()
+            store.set_quantity(product_id, 0)
             messages.success(request, 'Товар удален из корзины')
         elif quantity > cart_item.product.stock:
             messages.error(request, f'Максимальное количество: {cart_item.product.stock} шт.')
         else:
             cart_item.quantity = quantity
-            cart_item.save()
+            store.set_quantity(product_id, quantity)
             messages.success(request, 'Количество обновлено')
 
+        summary = _cart_changed(store)
+
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            cart = cart_item.cart
             return JsonResponse({
                 'success': True,
                 'item_total': float(cart_item.total_price) if quantity > 0 else 0,
-                'cart_total': float(cart.total_price),
-                'cart_items_count': cart.total_items
+                **summary.as_json(),
             })
 
     return redirect('orders:cart')
 
 
-@login_required
-def remove_from_cart(request, item_id):
+def remove_from_cart(request, product_id):
     """Удаление товара из корзины"""
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
-    product_name = cart_item.product.name
-    cart_item.delete()
-    messages.success(request, f'{product_name} удален из корзины')
+    store = get_store(request)
+    cart_item = _cart_item(store, product_id)
+    store.set_quantity(product_id, 0)
+    messages.success(request, f'{cart_item.product.name} удален из корзины')
+
+    summary = _cart_changed(store)
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        cart = Cart.objects.get(user=request.user)
         return JsonResponse({
             'success': True,
-            'cart_total': float(cart.total_price),
-            'cart_items_count': cart.total_items
+            **summary.as_json(),
         })
 
     return redirect('orders:cart')
 
 
-@login_required
+def _parse_operations(body):
+    """
+    Операции пакетного изменения корзины:
+    [{"product_id": id, "quantity": n}, {"product_id": id, "delta": n}, ...]
+    или None, если запрос некорректен.
+    """
+    try:
+        operations = json.loads(body).get('operations')
+    except (ValueError, AttributeError):
+        return None
+    if not isinstance(operations, list) or not operations:
+        return None
+    for operation in operations:
+        if not isinstance(operation, dict) or not isinstance(operation.get('product_id'), int):
+            return None
+        values = [operation.get(name) for name in ('quantity', 'delta') if name in operation]
+        if len(values) != 1 or not isinstance(values[0], int) or isinstance(values[0], bool):
+            return None
+    return operations
+
+
+@require_POST
+def update_cart(request):
+    """
+    Пакетное изменение корзины (JSON). Остатки всех продуктов проверяются
+    одним запросом, изменения применяются вместе или не применяются вовсе.
+    """
+    operations = _parse_operations(request.body)
+    if operations is None:
+        return JsonResponse({
+            'success': False,
+            'message': 'Ожидается {"operations": [{"product_id": ..., "quantity" или "delta": ...}]}',
+        }, status=400)
+
+    store = get_writable_store(request)
+    lines = store.lines()
+    product_ids = {operation['product_id'] for operation in operations}
+    stock = dict(Product.objects.filter(pk__in=product_ids, is_available=True).values_list('pk', 'stock'))
+
+    # Операции над одним продуктом применяются по порядку
+    quantities = {}
+    errors = []
+    for index, operation in enumerate(operations):
+        product_id = operation['product_id']
+        current = quantities.get(product_id, lines.get(product_id, 0))
+        quantity = max(operation['quantity'] if 'quantity' in operation else current + operation['delta'], 0)
+        if quantity and product_id not in stock:
+            errors.append({'index': index, 'product_id': product_id, 'message': 'Продукт недоступен'})
+        elif quantity > stock.get(product_id, 0):
+            errors.append({
+                'index': index,
+                'product_id': product_id,
+                'message': f'Максимальное количество: {stock[product_id]} шт.',
+            })
+        quantities[product_id] = quantity
+
+    if errors:
+        return JsonResponse({'success': False, 'errors': errors}, status=409)
+
+    store.apply(quantities)
+
+    cart_items = store.items()
+    summary = CartSummary.from_items(cart_items)
+    store.remember_count(summary.total_items)
+    totals = {item.product_id: item for item in cart_items}
+    return JsonResponse({
+        'success': True,
+        'items': {
+            product_id: {
+                'quantity': totals[product_id].quantity if product_id in totals else 0,
+                'item_total': float(totals[product_id].total_price) if product_id in totals else 0,
+            }
+            for product_id in quantities
+        },
+        **summary.as_json(),
+    })
+
+
 def clear_cart(request):
     """Очистка корзины"""
     if request.method == 'POST':
-        cart = get_object_or_404(Cart, user=request.user)
-        cart.items.all().delete()
+        get_store(request).clear()
         messages.success(request, 'Корзина очищена')
 
     return redirect('orders:cart')
@@ -130,12 +219,13 @@ def clear_cart(request):
 @login_required
 def checkout_view(request):
     """Страница оформления заказа"""
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.select_related('product', 'product__category').all()
+    store = get_store(request)
+    cart_items = store.items()
+    summary = CartSummary.from_items(cart_items)
 
     # Проверка минимальной суммы
-    if cart.total_price < 500:
-        messages.error(request, 'Минимальная сумма заказа 500 ₽')
+    if not summary.meets_minimum:
+        messages.error(request, f'Минимальная сумма заказа {MIN_ORDER_TOTAL} ₽')
         return redirect('orders:cart')
 
     # Получаем адреса пользователя
@@ -156,49 +246,45 @@ def checkout_view(request):
 
         address = get_object_or_404(Address, id=address_id, user=request.user)
 
-        # Создаем заказ
-        order = Order.objects.create(
-            user=request.user,
-            full_name=request.user.get_full_name(),
-            email=request.user.email,
-            phone=request.user.phone,
-            delivery_address=address.get_full_address(),
-            entrance=address.entrance,
-            floor=address.floor,
-            apartment=address.apartment,
-            total_price=cart.total_price,
-            delivery_price=99,
-            payment_method=payment_method,
-            delivery_time=delivery_time or 'Сегодня с 18:00 до 22:00',
-            message=comment,
-            status='pending'
-        )
-
-        # Создаем позиции заказа
-        for item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                quantity=item.quantity,
-                price=item.product.price
+        # Заказ и списание остатков - одной транзакцией
+        try:
+            order = place_order(
+                request.user,
+                cart_items,
+                full_name=request.user.get_full_name(),
+                email=request.user.email,
+                phone=request.user.phone,
+                delivery_address=address.get_full_address(),
+                entrance=address.entrance,
+                floor=address.floor,
+                apartment=address.apartment,
+                payment_method=payment_method,
+                delivery_time=delivery_time or 'Сегодня с 18:00 до 22:00',
+                message=comment,
+                status='pending'
             )
-
-            # Уменьшаем остаток на складе
-            item.product.stock -= item.quantity
-            item.product.save()
+        except OutOfStock as exc:
+            for item, available in exc.shortages:
+                if available:
+                    messages.error(request, f'{item.product.name}: доступно только {available} шт.')
+                else:
+                    messages.error(request, f'{item.product.name}: нет в наличии')
+            if not exc.shortages:
+                messages.error(request, 'Остатки товаров изменились, проверьте корзину')
+            return redirect('orders:cart')
+
+        popularity.record_purchases([item.product_id for item in cart_items])
 
         # Очищаем корзину
-        cart.items.all().delete()
+        store.clear()
 
         messages.success(request, f'Заказ №{order.id} успешно оформлен!')
         return redirect('accounts:orders')
 
     context = {
-        'cart': cart,
         'cart_items': cart_items,
+        'summary': summary,
         'addresses': addresses,
-        'delivery_price': 99,
-        'total_with_delivery': cart.total_price + 99,
     }
 
     return render(request, 'orders/checkout.html', context)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Product, ProductImage, Favorite
+from .models import Brand, Category, Product, ProductCounter, ProductImage, Favorite
 
 
 class ProductImageInline(admin.TabularInline):
@@ -10,9 +10,18 @@ class ProductImageInline(admin.TabularInline):
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['icon', 'name', 'slug']
+    list_display = ['icon', 'name', 'slug', 'parent', 'depth']
+    list_filter = ['depth']
     search_fields = ['name']
     prepopulated_fields = {'slug': ('name',)}
+    readonly_fields = ['path', 'depth']
+
+
+@admin.register(Brand)
+class BrandAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug', 'key']
+    search_fields = ['name', 'key']
+    prepopulated_fields = {'slug': ('name',)}
 
 
 @admin.register(Product)
@@ -22,10 +31,11 @@ class ProductAdmin(admin.ModelAdmin):
         'stock', 'is_available', 'is_featured', 'is_new', 'is_organic'
     ]
     list_filter = [
-        'category', 'is_available', 'is_featured',
+        'category', 'brand', 'is_available', 'is_featured',
         'is_new', 'is_organic', 'unit'
     ]
-    search_fields = ['name', 'brand', 'category__name', 'description']
+    search_fields = ['name', 'brand__name', 'category__name', 'description']
+    autocomplete_fields = ['brand']
     list_editable = ['is_available', 'is_featured', 'price', 'stock']
     inlines = [ProductImageInline]
     readonly_fields = ['created_at', 'updated_at']
@@ -69,3 +79,10 @@ class FavoriteAdmin(admin.ModelAdmin):
     list_display = ['user', 'product', 'added_at']
     list_filter = ['added_at']
     search_fields = ['user__username', 'product__name']
+
+
+@admin.register(ProductCounter)
+class ProductCounterAdmin(admin.ModelAdmin):
+    list_display = ['product', 'views', 'purchases', 'score', 'updated_at']
+    search_fields = ['product__name']
+    readonly_fields = ['product', 'views', 'purchases', 'score', 'updated_at']
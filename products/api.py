@@ -0,0 +1,148 @@
+"""
+Машиночитаемый API каталога для мобильного приложения и партнёров.
+
+Ответ отдаётся потоком (StreamingHttpResponse): строки читаются через
+.values().iterator(), без создания экземпляров Product, поэтому выгрузка
+любого размера занимает постоянную память. Тяжёлые текстовые колонки
+читаются только если явно запрошены в ``fields``.
+"""
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from .filters import filter_products, get_sort
+from .pagination import SORT_KEYS
+from .suggest import suggest
+
+# Поле API -> поле модели для .values()
+API_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'brand': 'brand__name',
+    'category': 'category__slug',
+    'price': 'price',
+    'effective_price': 'effective_price',
+    'unit_price': 'unit_price',
+    'old_price': 'old_price',
+    'discount_percent': 'discount_percent',
+    'unit': 'unit',
+    'quantity': 'quantity',
+    'stock': 'stock',
+    'is_featured': 'is_featured',
+    'is_new': 'is_new',
+    'is_organic': 'is_organic',
+    'image': 'main_image__image',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+    # Тяжёлые поля - только по запросу
+    'description': 'description',
+    'ingredients': 'ingredients',
+    'nutritional_value': 'nutritional_value',
+    'country_origin': 'country_origin',
+    'expiry_date': 'expiry_date',
+    'storage_conditions': 'storage_conditions',
+}
+
+DEFAULT_FIELDS = [
+    'id', 'name', 'brand', 'category', 'price', 'effective_price', 'unit_price', 'old_price', 'discount_percent',
+    'unit', 'quantity', 'stock', 'is_featured', 'is_new', 'is_organic', 'image',
+    'updated_at',
+]
+
+CHUNK_SIZE = 2000
+
+# Сколько строк склеивать в один кусок ответа
+ROWS_PER_WRITE = 100
+
+
+def _parse_fields(value):
+    """Список запрошенных полей API или None при неизвестном поле"""
+    if not value:
+        return DEFAULT_FIELDS
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    if not fields or any(field not in API_FIELDS for field in fields):
+        return None
+    return list(dict.fromkeys(fields))
+
+
+def _serialize(rows, fields, ndjson):
+    """Генератор кусков ответа из строк .values()"""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    columns = [API_FIELDS[field] for field in fields]
+    image_column = API_FIELDS['image'] if 'image' in fields else None
+
+    separator = '\n' if ndjson else ','
+    if not ndjson:
+        yield '['
+
+    buffer = []
+    first = True
+    for row in rows:
+        if image_column:
+            name = row[image_column]
+            row[image_column] = default_storage.url(name) if name else None
+        item = encoder.encode({field: row[column] for field, column in zip(fields, columns)})
+        if ndjson:
+            buffer.append(item + separator)
+        else:
+            buffer.append(item if first else separator + item)
+        first = False
+        if len(buffer) >= ROWS_PER_WRITE:
+            yield ''.join(buffer)
+            buffer = []
+
+    if buffer:
+        yield ''.join(buffer)
+    if not ndjson:
+        yield ']'
+
+
+@require_GET
+def products_api(request):
+    """
+    Потоковая выгрузка каталога.
+
+    Параметры: те же фильтры и сортировка, что у каталога, а также
+    ``format`` (json или ndjson), ``fields`` (список полей через запятую)
+    и ``limit``.
+    """
+    fields = _parse_fields(request.GET.get('fields'))
+    if fields is None:
+        return JsonResponse({
+            'error': 'Неизвестное поле',
+            'available_fields': list(API_FIELDS),
+        }, status=400)
+
+    output_format = request.GET.get('format', 'json')
+    if output_format not in ('json', 'ndjson'):
+        return JsonResponse({'error': 'format должен быть json или ndjson'}, status=400)
+
+    products = filter_products(request.GET).order_by(*SORT_KEYS[get_sort(request.GET)])
+
+    try:
+        limit = int(request.GET.get('limit') or 0)
+    except ValueError:
+        limit = -1
+    if limit < 0:
+        return JsonResponse({'error': 'limit должен быть неотрицательным числом'}, status=400)
+    if limit:
+        products = products[:limit]
+
+    rows = products.values(*[API_FIELDS[field] for field in fields]).iterator(chunk_size=CHUNK_SIZE)
+
+    ndjson = output_format == 'ndjson'
+    response = StreamingHttpResponse(
+        _serialize(rows, fields, ndjson),
+        content_type='application/x-ndjson; charset=utf-8' if ndjson else 'application/json; charset=utf-8',
+    )
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@require_GET
+def suggest_api(request):
+    """Подсказки поиска по мере ввода (параметр q)"""
+    response = JsonResponse(suggest(request.GET.get('q', '')), json_dumps_params={'ensure_ascii': False})
+    response['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,44 @@
+"""
+Производители в фильтрах каталога.
+
+Справочник производителей небольшой: он читается одним запросом и хранится
+в общем кэше до изменения производителей (пространство имён brand,
+см. products/cache.py). Фильтр ``?brand=<slug>`` превращается в условие
+по индексированной колонке brand_id, без JOIN с таблицей производителей.
+"""
+from .cache import BRAND, cached
+from .models import Brand
+
+BRANDS_CACHE_TIMEOUT = 86400
+
+# Сколько производителей показывать в фасете
+BRAND_FACET_LIMIT = 20
+
+
+def get_brands():
+    """Производители по slug из кэша"""
+    return cached(
+        'brands:all', [BRAND],
+        lambda: {brand.slug: brand for brand in Brand.objects.only('name', 'slug')},
+        BRANDS_CACHE_TIMEOUT,
+    )
+
+
+def filter_by_brand(queryset, slug):
+    """Продукты производителя slug"""
+    brand = get_brands().get(slug)
+    if brand is None:
+        return queryset.none()
+    return queryset.filter(brand_id=brand.pk)
+
+
+def brand_facet(counts, current_slug=None):
+    """
+    Производители для фасета: самые частые в текущей выборке (counts -
+    {id производителя: количество}) и выбранный, даже если в выборке его нет.
+    """
+    brands = [brand for brand in get_brands().values() if counts.get(brand.pk) or brand.slug == current_slug]
+    for brand in brands:
+        brand.facet_count = counts.get(brand.pk, 0)
+    brands.sort(key=lambda brand: (brand.slug != current_slug, -brand.facet_count, brand.name))
+    return brands[:BRAND_FACET_LIMIT]
@@ -0,0 +1,108 @@
+"""
+Версии кэша и инвалидация данных, построенных по каталогу.
+
+Каждое кэшируемое значение зависит от одного или нескольких пространств
+имён:
+
+- catalog - любое изменение продуктов, категорий, производителей и изображений;
+- category - дерево категорий;
+- brand - справочник производителей;
+- product:<id> - один продукт и его изображения;
+- popularity - порядок сортировки «Популярные» (products/popularity.py).
+
+У пространства есть счётчик версии в общем кэше. Значение хранится под
+ключом, в который входят версии всех его пространств (cached), поэтому
+после invalidate() старые записи просто перестают читаться и вытесняются
+по таймауту. Версии увеличивают сигналы моделей (products/signals.py);
+массовые UPDATE, которые сигналов не вызывают, должны идти через
+update_products() или вызывать invalidate_products().
+
+Данные в памяти процесса (индекс подсказок поиска, колоночный движок)
+сравнивают свою версию каталога с текущей и перестраиваются, когда она
+изменилась.
+"""
+import time
+
+from django.core.cache import cache
+
+CATALOG = 'catalog'
+CATEGORY = 'category'
+BRAND = 'brand'
+POPULARITY = 'popularity'
+
+DEFAULT_TIMEOUT = 86400
+
+_missing = object()
+
+
+def product_namespace(pk):
+    return f'product:{pk}'
+
+
+def _version_key(namespace):
+    return f'{namespace}:version'
+
+
+def _initial_version():
+    # Время в миллисекундах: после очистки кэша версия не совпадёт ни с одной старой
+    return int(time.time() * 1000)
+
+
+def get_versions(namespaces):
+    """Текущие версии пространств имён (одним обращением к кэшу)"""
+    keys = [_version_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def get_version(namespace):
+    """Текущая версия пространства имён"""
+    return get_versions([namespace])[0]
+
+
+def invalidate(*namespaces):
+    """Сделать устаревшими все значения, зависящие от пространств имён"""
+    for namespace in dict.fromkeys(namespaces):
+        key = _version_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), timeout=None)
+
+
+def cached(name, namespaces, compute, timeout=DEFAULT_TIMEOUT):
+    """Значение name из кэша или compute(), если пространства имён изменились"""
+    versions = get_versions(namespaces)
+    key = ':'.join([name, *(f'{namespace}={version}' for namespace, version in zip(namespaces, versions))])
+    value = cache.get(key, _missing)
+    if value is _missing:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+def invalidate_products(product_ids):
+    """Отметить изменение продуктов (и каталога в целом)"""
+    invalidate(CATALOG, *(product_namespace(pk) for pk in product_ids))
+
+
+def update_products(queryset, **values):
+    """queryset.update() для продуктов с инвалидацией; возвращает количество строк"""
+    product_ids = list(queryset.values_list('pk', flat=True))
+    updated = queryset.model._default_manager.filter(pk__in=product_ids).update(**values)
+    invalidate_products(product_ids)
+    return updated
+
+
+def get_catalog_version():
+    """Текущая версия каталога"""
+    return get_version(CATALOG)
+
+
+def bump_catalog_version():
+    """Отметить изменение каталога"""
+    invalidate(CATALOG)
@@ -0,0 +1,104 @@
+"""
+Дерево категорий.
+
+Категории вложены друг в друга (Category.parent), а у каждой хранится
+материализованный путь - id всех предков через точку. Поддерево категории
+выбирается одним условием ``path LIKE 'путь%'`` по индексу, без рекурсивных
+запросов, поэтому фильтр каталога по разделу включает продукты всех его
+подразделов.
+
+Само дерево небольшое и меняется редко: оно строится одним запросом и
+хранится в общем кэше до изменения категорий (пространство имён category,
+см. products/cache.py), так что сайдбар каталога и фильтры не обращаются
+к базе за категориями.
+"""
+from collections import defaultdict
+
+from .cache import CATEGORY, cached
+from .models import Category
+
+TREE_CACHE_TIMEOUT = 86400
+
+
+class CategoryTree:
+    """Категории в порядке обхода дерева; соседние категории - по названию"""
+
+    def __init__(self, categories):
+        self.by_pk = {category.pk: category for category in categories}
+        self.by_slug = {category.slug: category for category in categories}
+
+        self.children = defaultdict(list)
+        for category in sorted(categories, key=lambda category: category.name):
+            self.children[category.parent_id].append(category)
+
+        self.nodes = []
+        self._walk(None, self.nodes.append)
+
+    def _walk(self, parent_id, visit, expanded=None):
+        for category in self.children.get(parent_id, []):
+            visit(category)
+            if expanded is None or category.pk in expanded:
+                self._walk(category.pk, visit, expanded)
+
+    def get(self, slug):
+        return self.by_slug.get(slug)
+
+    def ancestors(self, category):
+        """Предки категории от корня, включая её саму"""
+        return [self.by_pk[int(pk)] for pk in category.path.split('.')[:-1]]
+
+    def subtree(self, slug):
+        """Категория slug и все её подкатегории"""
+        category = self.get(slug)
+        if category is None:
+            return []
+        return [node for node in self.nodes if node.path.startswith(category.path)]
+
+    def subtree_slugs(self, slug):
+        """slug категории и всех её подкатегорий"""
+        return {node.slug for node in self.subtree(slug)}
+
+    def totals(self, counts):
+        """Счётчики по slug, сложенные по поддеревьям"""
+        totals = {node.slug: counts.get(node.slug, 0) for node in self.nodes}
+        # При обходе с конца подкатегории встречаются раньше родителя
+        for node in reversed(self.nodes):
+            if node.parent_id:
+                totals[self.by_pk[node.parent_id].slug] += totals[node.slug]
+        return totals
+
+    def sidebar(self, current_slug, counts):
+        """
+        Категории для сайдбара каталога: корневые и подкатегории
+        выбранной категории и её предков. facet_count - количество
+        продуктов во всём поддереве.
+        """
+        current = self.get(current_slug)
+        expanded = {category.pk for category in self.ancestors(current)} if current else set()
+        totals = self.totals(counts)
+
+        visible = []
+        self._walk(None, visible.append, expanded)
+        for category in visible:
+            category.facet_count = totals[category.slug]
+            category.has_children = bool(self.children.get(category.pk))
+            category.is_expanded = category.pk in expanded
+        return visible
+
+
+def get_tree():
+    """Дерево категорий из кэша; строится заново после изменения категорий"""
+    categories = cached(
+        'categories:tree', [CATEGORY],
+        lambda: list(Category.objects.only('name', 'slug', 'icon', 'parent', 'path', 'depth')),
+        TREE_CACHE_TIMEOUT,
+    )
+    return CategoryTree(categories)
+
+
+def filter_by_category(queryset, slug):
+    """Продукты категории slug и всех её подкатегорий"""
+    category = get_tree().get(slug)
+    if category is None:
+        return queryset.none()
+    return queryset.filter(category__path__startswith=category.path)
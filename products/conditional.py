@@ -0,0 +1,126 @@
+"""
+Условные GET-запросы (ETag / Last-Modified) для страниц каталога.
+
+Валидатор страницы складывается из двух частей:
+- состояние данных: версия каталога (products/cache.py) для списков,
+  а для детальной страницы - дата изменения продукта и его изображений;
+- персональное состояние: пользователь, его избранное, количество
+  товаров в корзине (бейдж в шапке) и CSRF-cookie, токен которой
+  вставлен в формы страницы.
+
+Если любая часть изменилась, ETag другой и страница отрисовывается
+заново; иначе браузер или поисковый робот получает 304 без рендеринга
+шаблона. Пока у пользователя есть неотображённые сообщения (messages),
+валидатор не выдаётся - иначе сообщение не было бы показано.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .cache import POPULARITY, cached, get_catalog_version, get_version, product_namespace
+from .filters import POPULAR_SORT, get_sort
+from .models import Favorite, Product
+
+
+def _hash(*parts):
+    return hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def user_state(request):
+    """
+    Отпечаток персональной части страницы
+    или None, если страницу нельзя отдавать из кэша клиента.
+    """
+    if len(get_messages(request)):
+        return None
+
+    # Импорт здесь: orders зависит от products
+    from orders.store import get_store
+
+    csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    cart_items = get_store(request).count()
+    user = request.user
+    if not user.is_authenticated:
+        return _hash('anonymous', cart_items, csrf_cookie)
+
+    favorites = sorted(Favorite.objects.filter(user=user).values_list('product_id', flat=True))
+    return _hash(user.pk, user.updated_at.isoformat(), favorites, cart_items, csrf_cookie)
+
+
+def catalog_etag(request, *args, **kwargs):
+    """ETag страниц каталога: версия каталога и персональное состояние"""
+    state = user_state(request)
+    if state is None:
+        return None
+    # Порядок популярных продуктов меняется и без изменения каталога
+    popularity = get_version(POPULARITY) if get_sort(request.GET) == POPULAR_SORT else None
+    return _hash('catalog', get_catalog_version(), popularity, state)
+
+
+def _product_state(pk):
+    """Дата изменения продукта и его изображений или None; из кэша до изменения продукта"""
+    return cached(f'product-state:{pk}', [product_namespace(pk)], lambda: Product.objects.filter(pk=pk).annotate(
+        images_count=Count('images'),
+        images_uploaded_at=Max('images__uploaded_at'),
+    ).values('updated_at', 'main_image_id', 'images_count', 'images_uploaded_at').first())
+
+
+def product_last_modified(request, pk):
+    """
+    Last-Modified детальной страницы - только для анонимных посетителей
+    без корзины: дата не отражает персональное состояние, а клиент,
+    приславший только If-Modified-Since, получил бы 304 после изменения
+    избранного или корзины.
+    """
+    from orders.store import has_session_cart
+
+    if request.user.is_authenticated or has_session_cart(request) or len(get_messages(request)):
+        return None
+    state = _product_state(pk)
+    if state is None:
+        return None
+    return max(filter(None, [state['updated_at'], state['images_uploaded_at']]))
+
+
+def product_etag(request, pk):
+    """
+    ETag детальной страницы. Версия каталога тоже входит в него:
+    в блоке похожих продуктов показываются карточки других продуктов.
+    """
+    state = _product_state(pk)
+    personal = user_state(request)
+    if state is None or personal is None:
+        return None
+    return _hash('product', pk, *state.values(), get_catalog_version(), personal)
+
+
+def conditional_page(etag_func, last_modified_func=None, on_view=None):
+    """
+    Декоратор страницы с валидаторами: 304 при совпадении, а браузер
+    обязан перепроверять страницу при каждом показе.
+
+    on_view(request, *args, **kwargs) вызывается для каждого показа
+    страницы (200 или 304): при 304 само представление не выполняется,
+    и учитывать показ в нём нельзя.
+    """
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if on_view is not None and response.status_code in (200, 304):
+                on_view(request, *args, **kwargs)
+            if response.has_header('ETag'):
+                if request.user.is_authenticated:
+                    patch_cache_control(response, no_cache=True, private=True)
+                else:
+                    patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,238 @@
+"""
+Колоночный движок каталога.
+
+Каталог читается в тысячи раз чаще, чем меняется, а каждая страница
+заново фильтрует и сортирует продукты в базе. Движок держит в памяти
+процесса доступные продукты в виде колонок NumPy (цена со скидкой, цена
+за кг/л, категория, производитель, флаги, дата добавления) и готовые
+перестановки для каждой сортировки каталога:
+
+- фильтр - булева маска по колонкам;
+- сортировка - заранее посчитанная перестановка, из которой маска
+  выбирает продукты по порядку;
+- курсор страницы (тот же, что в products/pagination.py) переводится
+  в позицию в перестановке двоичным поиском.
+
+Из базы читаются только продукты страницы - по первичному ключу.
+Копия перестраивается, когда меняется версия каталога (её увеличивают
+сигналы продуктов, категорий и изображений, см. products/signals.py).
+
+Движок включается настройкой CATALOG_ENGINE = 'columnar'. Поиск по тексту
+и сортировки по релевантности и популярности (она меняется без смены
+версии каталога) он не выполняет - такие запросы, как и запросы
+с некорректными параметрами, идут через ORM.
+"""
+import datetime
+import threading
+from bisect import bisect_right
+from decimal import ROUND_CEILING, ROUND_FLOOR, Decimal, InvalidOperation
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+from .brands import get_brands
+from .cache import get_catalog_version
+from .categories import get_tree
+from .models import Product
+from .pagination import PAGE_SIZE, SORT_KEYS, InvalidCursor, KeysetPage, decode_cursor, encode_cursor
+
+COLUMNS = ('pk', 'category_id', 'brand_id', 'is_organic', 'is_new', 'effective_price', 'unit_price', 'created_at', 'name')
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+# Сколько позиций перестановки проверять за один шаг при выборе страницы
+SCAN_BLOCK = 4096
+
+
+def _cents(value):
+    return int(Decimal(value) * 100)
+
+
+def _microseconds(value):
+    return (value - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def _price_bound(value, rounding):
+    """Граница фильтра по цене в копейках или None, если значение некорректно"""
+    try:
+        value = Decimal(value)
+    except InvalidOperation:
+        return None
+    if not value.is_finite():
+        return None
+    return int((value * 100).to_integral_value(rounding=rounding))
+
+
+class CatalogEngine:
+    """Колонки доступных продуктов и перестановки для сортировок каталога"""
+
+    def __init__(self, rows):
+        pk, category, brand, organic, new, price, unit_price, created, names = (
+            zip(*rows) if rows else [()] * len(COLUMNS)
+        )
+        self.pk = np.array(pk, dtype=np.int64)
+        self.category = np.array(category, dtype=np.int64)
+        # 0 - продукт без производителя
+        self.brand = np.array([brand_id or 0 for brand_id in brand], dtype=np.int64)
+        self.is_organic = np.array(organic, dtype=bool)
+        self.is_new = np.array(new, dtype=bool)
+        self.price = np.array([_cents(value) for value in price], dtype=np.int64)
+
+        columns = {
+            'created_at': np.array([_microseconds(value) for value in created], dtype=np.int64),
+            'effective_price': self.price,
+            'unit_price': np.array([_cents(value) for value in unit_price], dtype=np.int64),
+        }
+
+        # Для каждой сортировки - перестановка и ключи в её порядке. Обратные
+        # сортировки хранятся как прямые по ключу с минусом
+        self.orders = {}
+        for sort, keys in SORT_KEYS.items():
+            name = keys[0].lstrip('-')
+            if name not in columns and name != 'name':
+                continue
+            sign = -1 if keys[0].startswith('-') else 1
+            pks = self.pk * sign
+            if name == 'name':
+                # Строки сравниваются по кодам символов, как BINARY в SQLite
+                order = sorted(range(len(names)), key=lambda index: (names[index], pk[index]))
+                permutation = np.array(order, dtype=np.int64)
+                sorted_keys = [(names[index], pk[index]) for index in order]
+            else:
+                key = columns[name] * sign
+                permutation = np.lexsort((pks, key))
+                sorted_keys = (key[permutation], pks[permutation])
+            self.orders[sort] = (permutation, sign, sorted_keys)
+
+    @classmethod
+    def load(cls):
+        """Копия доступных продуктов из базы"""
+        rows = Product.objects.filter(is_available=True).values_list(*COLUMNS)
+        return cls(list(rows.iterator(chunk_size=5000)))
+
+    def __len__(self):
+        return len(self.pk)
+
+    def mask(self, params):
+        """Маска продуктов по GET-параметрам каталога или None, если параметры некорректны"""
+        mask = np.ones(len(self), dtype=bool)
+
+        category = params.get('category')
+        if category:
+            mask &= np.isin(self.category, [node.pk for node in get_tree().subtree(category)])
+
+        brand_slug = params.get('brand')
+        if brand_slug:
+            brand = get_brands().get(brand_slug)
+            mask &= self.brand == (brand.pk if brand else -1)
+
+        if params.get('organic'):
+            mask &= self.is_organic
+        if params.get('new'):
+            mask &= self.is_new
+
+        for name, rounding, compare in (
+            ('price_from', ROUND_CEILING, np.greater_equal),
+            ('price_to', ROUND_FLOOR, np.less_equal),
+        ):
+            if params.get(name):
+                bound = _price_bound(params[name], rounding)
+                if bound is None:
+                    return None
+                mask &= compare(self.price, bound)
+        return mask
+
+    def position(self, sort, values):
+        """Сколько продуктов в порядке сортировки sort стоят не позже курсора values"""
+        permutation, sign, sorted_keys = self.orders[sort]
+        if isinstance(sorted_keys, list):
+            return bisect_right(sorted_keys, (values[0], values[1]))
+
+        keys, pks = sorted_keys
+        key, pk = values[0] * sign, values[1] * sign
+        low = np.searchsorted(keys, key, 'left')
+        high = np.searchsorted(keys, key, 'right')
+        return int(low + np.searchsorted(pks[low:high], pk, 'right'))
+
+    def page(self, sort, mask, start=0, per_page=PAGE_SIZE):
+        """id продуктов страницы с позиции start и есть ли следующая страница"""
+        permutation = self.orders[sort][0]
+        found = []
+        needed = per_page + 1
+        for begin in range(start, len(permutation), SCAN_BLOCK):
+            block = permutation[begin:begin + SCAN_BLOCK]
+            hits = block[mask[block]][:needed]
+            found.append(hits)
+            needed -= len(hits)
+            if not needed:
+                break
+
+        indexes = np.concatenate(found) if found else np.array([], dtype=np.int64)
+        ids = self.pk[indexes].tolist()
+        return ids[:per_page], len(ids) > per_page
+
+
+_lock = threading.Lock()
+_engine = None
+_engine_version = None
+
+
+def get_engine():
+    """Движок текущего процесса; перестраивается при смене версии каталога"""
+    global _engine, _engine_version
+    version = get_catalog_version()
+    if _engine is None or _engine_version != version:
+        with _lock:
+            if _engine is None or _engine_version != version:
+                _engine = CatalogEngine.load()
+                _engine_version = version
+    return _engine
+
+
+def is_enabled():
+    return settings.CATALOG_ENGINE == 'columnar'
+
+
+def _cursor_values(sort, cursor):
+    """Значения курсора в единицах колонок движка"""
+    name = SORT_KEYS[sort][0].lstrip('-')
+    key, pk = decode_cursor(cursor, sort)
+    try:
+        pk = int(pk)
+        if name == 'name':
+            return key, pk
+        if name == 'created_at':
+            value = Product._meta.get_field(name).to_python(key)
+            if value is None or value.tzinfo is None:
+                raise ValueError('Дата в курсоре без часового пояса')
+            return _microseconds(value), pk
+        return _cents(Product._meta.get_field(name).to_python(key)), pk
+    except (ValueError, TypeError, ValidationError, InvalidOperation) as exc:
+        raise InvalidCursor(str(exc))
+
+
+def paginate(params, sort, cursor=None, per_page=PAGE_SIZE):
+    """Страница каталога или None, если запрос должен выполняться через ORM"""
+    if params.get('search'):
+        return None
+
+    engine = get_engine()
+    if sort not in engine.orders:
+        return None
+    mask = engine.mask(params)
+    if mask is None:
+        return None
+
+    start = engine.position(sort, _cursor_values(sort, cursor)) if cursor else 0
+    ids, has_next = engine.page(sort, mask, start, per_page)
+
+    products = Product.objects.select_related('category', 'main_image').for_listing().in_bulk(ids)
+    # Продукт могли удалить после построения копии
+    object_list = [products[pk] for pk in ids if pk in products]
+
+    next_cursor = None
+    if has_next and object_list:
+        last = object_list[-1]
+        next_cursor = encode_cursor(sort, [getattr(last, key.lstrip('-')) for key in SORT_KEYS[sort]])
+    return KeysetPage(object_list, next_cursor)
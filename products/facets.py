@@ -0,0 +1,163 @@
+"""
+Счётчики фасетов каталога.
+
+Все счётчики (категории, производители, органические, новинки, диапазоны
+цен) считаются одним GROUP BY-запросом по комбинациям значений фасетов.
+Дальше строки складываются в Python: для каждого фасета учитываются все
+активные фильтры, кроме его собственного, - так счётчик показывает,
+сколько продуктов будет найдено, если выбрать это значение.
+
+Готовые счётчики хранятся в кэше для каждого набора фильтров до
+следующего изменения каталога, так что повторные запросы с теми же
+фильтрами не обращаются к базе.
+"""
+import hashlib
+from decimal import Decimal
+
+from django.db.models import BooleanField, Case, Count, IntegerField, Q, Value, When
+
+from .brands import get_brands
+from .cache import CATALOG, cached
+from .categories import get_tree
+from .filters import search_products
+
+# Параметры каталога, от которых зависят счётчики
+FACET_PARAMS = ('search', 'category', 'brand', 'organic', 'new', 'price_from', 'price_to')
+
+FACETS_CACHE_TIMEOUT = 3600
+
+CENT = Decimal('0.01')
+
+# Диапазоны цены со скидкой в рублях: [от, до); None - без границы
+PRICE_BUCKETS = [
+    (None, 100),
+    (100, 300),
+    (300, 500),
+    (500, 1000),
+    (1000, None),
+]
+
+
+def _bucket_label(price_from, price_to):
+    if price_from is None:
+        return f'до {price_to} ₽'
+    if price_to is None:
+        return f'от {price_from} ₽'
+    return f'{price_from}–{price_to} ₽'
+
+
+def _bucket_params(price_from, price_to):
+    """
+    Параметры фильтра по цене для диапазона. Фильтр включает верхнюю
+    границу, поэтому она на копейку меньше начала следующего диапазона:
+    продукт на границе попадает ровно в один диапазон.
+    """
+    return {
+        'price_from': price_from,
+        'price_to': price_to - CENT if price_to is not None else None,
+    }
+
+
+def _bucket_expression():
+    """Номер диапазона цены продукта - по тем же условиям, что и фильтр"""
+    whens = [
+        When(_price_filter(_bucket_params(*bucket)), then=Value(index))
+        for index, bucket in enumerate(PRICE_BUCKETS)
+    ]
+    return Case(*whens, output_field=IntegerField())
+
+
+def _price_filter(params):
+    """Условие фильтра по цене из параметров или None"""
+    condition = Q()
+    if params.get('price_from'):
+        condition &= Q(effective_price__gte=params['price_from'])
+    if params.get('price_to'):
+        condition &= Q(effective_price__lte=params['price_to'])
+    return condition or None
+
+
+def get_facets(params):
+    """Счётчики фасетов из кэша (см. count_facets)"""
+    filters = '&'.join(f'{name}={params.get(name, "")}' for name in FACET_PARAMS)
+    return cached(
+        f'facets:{hashlib.md5(filters.encode()).hexdigest()}', [CATALOG],
+        lambda: count_facets(params),
+        FACETS_CACHE_TIMEOUT,
+    )
+
+
+def count_facets(params):
+    """
+    Счётчики фасетов для текущего набора фильтров.
+
+    Возвращает словарь:
+    - total: количество продуктов со всеми фильтрами;
+    - categories: {slug: количество} без учёта подкатегорий
+      (суммы по поддеревьям - CategoryTree.totals);
+    - brands: {id производителя: количество};
+    - organic, new: количество при включении флага;
+    - price_buckets: список диапазонов цен со счётчиками.
+    """
+    category_filter = params.get('category')
+    category_slugs = get_tree().subtree_slugs(category_filter) if category_filter else None
+    brand_filter = params.get('brand')
+    brand = get_brands().get(brand_filter) if brand_filter else None
+    organic_filter = bool(params.get('organic'))
+    new_filter = bool(params.get('new'))
+    price_condition = _price_filter(params)
+
+    in_price_range = Value(True, output_field=BooleanField())
+    if price_condition is not None:
+        in_price_range = Case(
+            When(price_condition, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        )
+
+    rows = search_products(params).order_by().values(
+        'category__slug', 'brand_id', 'is_organic', 'is_new',
+        price_bucket=_bucket_expression(),
+        in_price_range=in_price_range,
+    ).annotate(count=Count('pk'))
+
+    facets = {
+        'total': 0,
+        'categories': {},
+        'brands': {},
+        'organic': 0,
+        'new': 0,
+        'price_buckets': [0] * len(PRICE_BUCKETS),
+    }
+
+    for row in rows:
+        count = row['count']
+        category_ok = category_slugs is None or row['category__slug'] in category_slugs
+        brand_ok = not brand_filter or (brand is not None and row['brand_id'] == brand.pk)
+        organic_ok = not organic_filter or row['is_organic']
+        new_ok = not new_filter or row['is_new']
+        price_ok = row['in_price_range']
+
+        if brand_ok and organic_ok and new_ok and price_ok:
+            slug = row['category__slug']
+            facets['categories'][slug] = facets['categories'].get(slug, 0) + count
+        if category_ok and organic_ok and new_ok and price_ok and row['brand_id']:
+            facets['brands'][row['brand_id']] = facets['brands'].get(row['brand_id'], 0) + count
+        if category_ok and brand_ok and new_ok and price_ok and row['is_organic']:
+            facets['organic'] += count
+        if category_ok and brand_ok and organic_ok and price_ok and row['is_new']:
+            facets['new'] += count
+        if category_ok and brand_ok and organic_ok and new_ok and row['price_bucket'] is not None:
+            facets['price_buckets'][row['price_bucket']] += count
+        if category_ok and brand_ok and organic_ok and new_ok and price_ok:
+            facets['total'] += count
+
+    facets['price_buckets'] = [
+        {
+            'label': _bucket_label(price_from, price_to),
+            **_bucket_params(price_from, price_to),
+            'count': facets['price_buckets'][index],
+        }
+        for index, (price_from, price_to) in enumerate(PRICE_BUCKETS)
+    ]
+    return facets
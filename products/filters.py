@@ -0,0 +1,76 @@
+"""
+Фильтры каталога.
+
+Общая логика для страницы каталога и её фрагментов: какие продукты
+показывать при заданных GET-параметрах и в каком порядке.
+"""
+from .brands import filter_by_brand
+from .categories import filter_by_category
+from .models import Product
+from . import popularity, search
+
+SORT_OPTIONS = ['-created_at', 'popular', 'price', '-price', 'unit_price', 'name']
+DEFAULT_SORT = '-created_at'
+
+# Сортировка по релевантности - при поиске без явно выбранной сортировки
+RELEVANCE_SORT = 'relevance'
+
+# Сортировка по трендовости (см. products/popularity.py)
+POPULAR_SORT = 'popular'
+
+
+def get_sort(params):
+    """Активная сортировка каталога"""
+    sort = params.get('sort')
+    searching = bool(params.get('search'))
+    if sort in SORT_OPTIONS or (sort == RELEVANCE_SORT and searching):
+        return sort
+    return RELEVANCE_SORT if searching else DEFAULT_SORT
+
+
+def search_products(params, queryset=None):
+    """Доступные продукты, найденные по поисковому запросу (без фильтров-фасетов)"""
+    if queryset is None:
+        queryset = Product.objects.filter(is_available=True)
+
+    search_query = params.get('search')
+    if search_query:
+        queryset = search.search(queryset, search_query)
+    return queryset
+
+
+def filter_products(params, queryset=None):
+    """Доступные продукты, отфильтрованные по GET-параметрам каталога"""
+    products = search_products(params, queryset).select_related('category', 'main_image').for_listing()
+
+    category_filter = params.get('category')
+    brand_filter = params.get('brand')
+    is_organic = params.get('organic')
+    is_new = params.get('new')
+    price_from = params.get('price_from')
+    price_to = params.get('price_to')
+
+    # Категория вместе со всеми подкатегориями
+    if category_filter:
+        products = filter_by_category(products, category_filter)
+
+    if brand_filter:
+        products = filter_by_brand(products, brand_filter)
+
+    if is_organic:
+        products = products.filter(is_organic=True)
+
+    if is_new:
+        products = products.filter(is_new=True)
+
+    # Цена - та, которую платит покупатель (со скидкой)
+    if price_from:
+        products = products.filter(effective_price__gte=price_from)
+
+    if price_to:
+        products = products.filter(effective_price__lte=price_to)
+
+    if get_sort(params) == POPULAR_SORT:
+        products = popularity.annotate_popularity(products)
+
+    return products
@@ -0,0 +1,73 @@
+"""
+Кэш HTML-фрагментов карточек продуктов.
+
+Неизменяемая для всех посетителей часть карточки (изображение, бейджи,
+вес, название, цена) рендерится один раз и хранится в кэше под ключом
+из id продукта, даты его изменения, главного изображения и категории -
+при любом изменении ключ меняется сам, и инвалидировать ничего не нужно.
+Персональные части (кнопка «В корзину» с CSRF-токеном, избранное)
+рендерятся каждый раз вокруг готового фрагмента.
+
+Фрагменты всей страницы читаются одним cache.get_many, отрисовываются
+только отсутствующие, и они же записываются одним cache.set_many.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+# Части карточки каталога: изображение с бейджами и описание с ценой
+CARD_TEMPLATES = {
+    'image': 'products/includes/product_card_image.html',
+    'info': 'products/includes/product_card_info.html',
+}
+
+# Карточка похожего продукта целиком одинакова для всех посетителей
+SIMILAR_CARD_TEMPLATES = {
+    'card': 'products/includes/similar_card.html',
+}
+
+# Старые ключи не переиспользуются, поэтому хранить фрагменты дольше суток незачем
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def card_cache_key(product, templates=CARD_TEMPLATES):
+    """Ключ фрагментов карточки продукта"""
+    main_image = ''
+    if product.main_image_id:
+        # Фрагмент меняется, когда для файла построены уменьшенные копии
+        main_image = f'{product.main_image.image.name}:{product.main_image.has_variants}'
+    # Категория не меняет updated_at продукта, но показывается в карточке
+    category = f'{product.category.name}:{product.category.icon}'
+    vary_on = ':'.join([
+        ','.join(templates.values()), str(product.pk), product.updated_at.isoformat(), main_image, category,
+    ])
+    return f'card:{product.pk}:{hashlib.md5(vary_on.encode()).hexdigest()}'
+
+
+def attach_card_html(products, templates=CARD_TEMPLATES):
+    """
+    Записать в product.card_html готовые фрагменты карточки каждого
+    продукта: словарь {часть: HTML} по ключам templates.
+    Продукты должны быть загружены с select_related('category', 'main_image').
+    """
+    products = list(products)
+    if not products:
+        return products
+
+    keys = {product.pk: card_cache_key(product, templates) for product in products}
+    cached = cache.get_many(keys.values())
+
+    compiled = {part: get_template(name) for part, name in templates.items()}
+    missing = {}
+    for product in products:
+        fragments = cached.get(keys[product.pk])
+        if fragments is None:
+            fragments = {part: template.render({'product': product}) for part, template in compiled.items()}
+            missing[keys[product.pk]] = fragments
+        product.card_html = {part: mark_safe(html) for part, html in fragments.items()}
+
+    if missing:
+        cache.set_many(missing, CARD_CACHE_TIMEOUT)
+    return products
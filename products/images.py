@@ -0,0 +1,222 @@
+"""
+Уменьшенные копии изображений продуктов.
+
+Для каждого загруженного изображения строятся варианты thumb/card/full
+в WebP и JPEG (для браузеров без WebP) и крошечное размытое превью
+(LQIP), которое встраивается в страницу как data URI и показывается,
+пока грузится настоящая картинка. Шаблоны получают srcset через свойства
+ProductImage, браузер сам выбирает подходящий размер.
+
+Перекодирование - работа для процессора, поэтому оно выполняется в пуле
+процессов: после загрузки изображения (products/signals.py) задача
+отправляется в пул и не задерживает ответ, а команда regenerate_images
+обрабатывает весь каталог на всех ядрах. Функции, которые выполняются
+в дочерних процессах, работают только с байтами и не обращаются к Django.
+"""
+import base64
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Наибольшая сторона варианта в пикселях
+SIZES = {
+    'thumb': 160,
+    'card': 480,
+    'full': 1200,
+}
+
+# Формат файла -> (формат Pillow, параметры сохранения)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+LQIP_SIZE = 16
+
+VARIANTS_DIR = 'products/variants'
+
+
+def _to_rgb(image):
+    """Изображение без прозрачности: фон под прозрачными областями - белый"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _encode(image, image_format):
+    pillow_format, params = FORMATS[image_format]
+    buffer = io.BytesIO()
+    image.save(buffer, pillow_format, **params)
+    return buffer.getvalue()
+
+
+def render_variants(data):
+    """
+    Построить варианты изображения (выполняется в дочернем процессе).
+
+    Возвращает {'sizes': {размер: {'width', 'height', формат: байты}}, 'lqip': data URI}.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        image = _to_rgb(ImageOps.exif_transpose(source))
+
+    sizes = {}
+    for name, max_side in SIZES.items():
+        variant = image.copy()
+        # thumbnail не увеличивает маленькие изображения
+        variant.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        sizes[name] = {'width': variant.width, 'height': variant.height}
+        for image_format in FORMATS:
+            sizes[name][image_format] = _encode(variant, image_format)
+
+    preview = image.copy()
+    preview.thumbnail((LQIP_SIZE, LQIP_SIZE))
+    buffer = io.BytesIO()
+    preview.save(buffer, 'JPEG', quality=40)
+    lqip = 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+    return {'sizes': sizes, 'lqip': lqip}
+
+
+def _read(image):
+    with image.image.open('rb') as file:
+        return file.read()
+
+
+def _delete_files(variants):
+    from django.core.files.storage import default_storage
+
+    for variant in variants.get('sizes', {}).values():
+        for image_format in FORMATS:
+            if variant.get(image_format):
+                default_storage.delete(variant[image_format])
+
+
+def delete_variants(image):
+    """Удалить файлы вариантов изображения"""
+    _delete_files(image.variants)
+
+
+def save_variants(image, result):
+    """Сохранить построенные варианты в хранилище и в ProductImage"""
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+
+    from .models import ProductImage
+
+    stem = os.path.splitext(os.path.basename(image.image.name))[0]
+    sizes = {}
+    for name, variant in result['sizes'].items():
+        sizes[name] = {'width': variant['width'], 'height': variant['height']}
+        for image_format in FORMATS:
+            sizes[name][image_format] = default_storage.save(
+                f'{VARIANTS_DIR}/{stem}_{name}.{"jpg" if image_format == "jpeg" else image_format}',
+                ContentFile(variant[image_format]),
+            )
+
+    old_variants = image.variants
+    image.variants = {'source': image.image.name, 'sizes': sizes}
+    image.lqip = result['lqip']
+    updated = ProductImage.objects.filter(pk=image.pk, image=image.image.name).update(
+        variants=image.variants, lqip=image.lqip
+    )
+    if updated:
+        _delete_files(old_variants)
+    else:
+        # Изображение удалено или заменено, пока строились варианты
+        _delete_files(image.variants)
+
+
+def process_images(images, workers=None):
+    """
+    Построить варианты для изображений в пуле из workers процессов
+    (по умолчанию - по числу ядер). Возвращает количество обработанных.
+    """
+    from .cache import invalidate_products
+
+    images = list(images)
+    processed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Файлы читаются по мере обработки, а не все сразу
+        pending = {}
+        queue = iter(images)
+        limit = (workers or os.cpu_count() or 1) * 2
+
+        def submit():
+            for image in queue:
+                try:
+                    pending[executor.submit(render_variants, _read(image))] = image
+                except OSError:
+                    logger.exception('Не удалось прочитать изображение %s', image.image.name)
+                    continue
+                if len(pending) >= limit:
+                    return
+
+        submit()
+        while pending:
+            future = next(iter(pending))
+            image = pending.pop(future)
+            try:
+                save_variants(image, future.result())
+                processed.append(image.product_id)
+            except Exception:
+                logger.exception('Не удалось обработать изображение %s', image.image.name)
+            submit()
+
+    if processed:
+        invalidate_products(set(processed))
+    return len(processed)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Пул процессов для фоновой обработки загрузок (создаётся при первом обращении)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from django.conf import settings
+
+            _executor = ProcessPoolExecutor(max_workers=settings.PRODUCT_IMAGE_WORKERS)
+        return _executor
+
+
+def _finish(pk, name, future):
+    """Сохранить результат фоновой обработки (в служебном потоке пула)"""
+    from django.db import connection
+
+    from .cache import invalidate_products
+    from .models import ProductImage
+
+    try:
+        # Изображение могли удалить или заменить, пока строились варианты
+        image = ProductImage.objects.filter(pk=pk, image=name).first()
+        if image is not None:
+            save_variants(image, future.result())
+            invalidate_products([image.product_id])
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', name)
+    finally:
+        connection.close()
+
+
+def schedule(image):
+    """Построить варианты изображения в фоне, не задерживая ответ"""
+    pk, name = image.pk, image.image.name
+    try:
+        data = _read(image)
+    except OSError:
+        logger.exception('Не удалось прочитать изображение %s', name)
+        return
+    future = _get_executor().submit(render_variants, data)
+    future.add_done_callback(lambda future: _finish(pk, name, future))
@@ -0,0 +1,67 @@
+import itertools
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import get_template
+from django.test import RequestFactory
+
+from products.fragments import attach_card_html, card_cache_key
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Замер времени рендеринга сетки карточек с кэшем фрагментов и без него'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='50,200,1000', help='Количество карточек через запятую')
+        parser.add_argument('--repeat', type=int, default=5, help='Количество повторов каждого замера')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        products = list(Product.objects.filter(is_available=True).select_related('category', 'main_image'))
+        if not products:
+            raise CommandError('Нет продуктов: загрузите данные командой load_products')
+
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        template = get_template('products/includes/catalog_page.html')
+
+        def render(page):
+            return template.render({'products': page, 'user_favorites': []}, request)
+
+        self.stdout.write(f'{"карточек":>10} {"без кэша":>12} {"промах":>12} {"попадание":>12} {"ускорение":>10}')
+        for size in sizes:
+            # Если продуктов меньше, чем карточек, они повторяются
+            page = list(itertools.islice(itertools.cycle(products), size))
+            keys = [card_cache_key(product) for product in page]
+
+            def without_cache():
+                for product in page:
+                    product.__dict__.pop('card_html', None)
+                render(page)
+
+            def cold():
+                cache.delete_many(keys)
+                render(attach_card_html(page))
+
+            def warm():
+                render(attach_card_html(page))
+
+            results = [self._measure(func, options['repeat']) for func in (without_cache, cold, warm)]
+            self.stdout.write(
+                f'{size:>10} {results[0]:>10.1f}мс {results[1]:>10.1f}мс {results[2]:>10.1f}мс '
+                f'{results[0] / results[2]:>9.1f}x'
+            )
+
+    def _measure(self, func, repeat):
+        """Лучшее время из repeat запусков, мс"""
+        func()
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best
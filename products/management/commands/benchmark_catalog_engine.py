@@ -0,0 +1,109 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from products import engine
+from products.cache import bump_catalog_version
+from products.filters import filter_products
+from products.models import Category, Product
+from products.pagination import paginate
+
+BATCH_SIZE = 5000
+
+UNITS = ['kg', 'g', 'l', 'ml', 'pcs']
+
+
+class Command(BaseCommand):
+    help = 'Замер выборки страниц каталога через ORM и через колоночный движок (products/engine.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=0, help='Создать тестовый набор из стольких продуктов (0 - текущий каталог)')
+        parser.add_argument('--pages', type=int, default=5, help='Сколько страниц подряд листать в каждом сценарии')
+        parser.add_argument('--repeat', type=int, default=5, help='Количество повторов каждого замера')
+
+    def handle(self, *args, **options):
+        # Тестовый набор создаётся в транзакции и откатывается после замера
+        with transaction.atomic():
+            if options['products']:
+                self._create_products(options['products'])
+            bump_catalog_version()
+
+            category = Category.objects.filter(products__is_available=True).first()
+            if category is None:
+                raise CommandError('Нет продуктов: загрузите данные командой load_products или укажите --products')
+
+            started = time.perf_counter()
+            catalog = engine.get_engine()
+            self.stdout.write(f'Копия каталога: {len(catalog)} продуктов за {(time.perf_counter() - started) * 1000:.0f} мс')
+
+            scenarios = [
+                ('новинки', {}, '-created_at'),
+                ('категория, дешевле', {'category': category.slug}, 'price'),
+                ('цена и органика', {'price_from': '100', 'price_to': '500', 'organic': '1'}, 'unit_price'),
+                ('по названию', {}, 'name'),
+            ]
+
+            self.stdout.write(f'{"сценарий":>20} {"ORM":>10} {"движок":>10} {"ускорение":>10}')
+            for label, params, sort in scenarios:
+                orm_pages = self._pages(lambda cursor: paginate(filter_products(params), sort, cursor=cursor), options['pages'])
+                engine_pages = self._pages(lambda cursor: engine.paginate(params, sort, cursor), options['pages'])
+                if orm_pages != engine_pages:
+                    self.stderr.write(self.style.ERROR(f'{label}: страницы движка отличаются от ORM'))
+
+                orm = self._measure(lambda: self._pages(lambda cursor: paginate(filter_products(params), sort, cursor=cursor), options['pages']), options['repeat'])
+                columnar = self._measure(lambda: self._pages(lambda cursor: engine.paginate(params, sort, cursor), options['pages']), options['repeat'])
+                self.stdout.write(
+                    f'{label:>20} {orm / options["pages"]:>8.2f}мс {columnar / options["pages"]:>8.2f}мс '
+                    f'{orm / columnar:>9.1f}x'
+                )
+            transaction.set_rollback(True)
+
+        bump_catalog_version()
+
+    def _create_products(self, count):
+        self.stdout.write(f'Создание {count} продуктов...')
+        categories = [
+            Category.objects.create(name=f'Benchmark {index}', slug=f'benchmark-engine-{index}')
+            for index in range(10)
+        ]
+        rng = random.Random(0)
+        for start in range(0, count, BATCH_SIZE):
+            Product.objects.bulk_create([
+                Product(
+                    category=rng.choice(categories),
+                    name=f'Продукт {rng.randrange(count)}',
+                    price=rng.randrange(2000, 200000) / 100,
+                    discount_percent=rng.choice([0, 0, 0, 10, 25]),
+                    unit=rng.choice(UNITS),
+                    quantity=rng.choice([0.5, 1, 100, 250, 500]),
+                    is_organic=rng.random() < 0.2,
+                    is_new=rng.random() < 0.1,
+                    stock=10,
+                )
+                for _ in range(start, min(start + BATCH_SIZE, count))
+            ])
+
+    def _pages(self, fetch, pages):
+        """id продуктов на pages страницах подряд"""
+        result = []
+        cursor = None
+        for _ in range(pages):
+            page = fetch(cursor)
+            result.append([product.pk for product in page])
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        return result
+
+    def _measure(self, func, repeat):
+        """Лучшее время из repeat запусков, мс"""
+        func()
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best
@@ -0,0 +1,72 @@
+import pickle
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.models import Category, Product
+
+# Примерный объём текста в тяжёлых полях одного продукта
+SAMPLE_TEXT = {
+    'description': 'Свежий продукт от проверенного поставщика, без консервантов. ' * 10,
+    'ingredients': 'молоко нормализованное, закваска, соль, стабилизатор. ' * 5,
+    'nutritional_value': 'Белки 3 г, жиры 2,5 г, углеводы 4,7 г; 52 ккал на 100 г. ' * 3,
+    'country_origin': 'Россия',
+    'expiry_date': '14 суток',
+    'storage_conditions': 'Хранить при температуре от +2 до +6 °C',
+}
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = 'Замер памяти на списки продуктов со всеми полями и без тяжёлых полей (for_listing)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000, help='Количество продуктов в тестовом наборе')
+        parser.add_argument('--page-size', type=int, default=24, help='Размер страницы для оценки объёма кэша')
+
+    def handle(self, *args, **options):
+        count = options['products']
+
+        # Тестовый набор создаётся в транзакции и откатывается после замера
+        with transaction.atomic():
+            category = Category.objects.create(name='Benchmark', slug='benchmark-listing-memory')
+            self.stdout.write(f'Создание {count} продуктов...')
+            for start in range(0, count, BATCH_SIZE):
+                Product.objects.bulk_create([
+                    Product(category=category, name=f'Продукт {index}', price=100, stock=10, **SAMPLE_TEXT)
+                    for index in range(start, min(start + BATCH_SIZE, count))
+                ])
+
+            products = Product.objects.filter(category=category).select_related('category', 'main_image')
+            results = [
+                ('все поля', self._measure(products, options['page_size'])),
+                ('for_listing', self._measure(products.for_listing(), options['page_size'])),
+            ]
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{"запрос":>12} {"время":>10} {"пик памяти":>12} {"на продукт":>12} {"страница в кэше":>16}')
+        for label, (elapsed, peak, page_size) in results:
+            self.stdout.write(
+                f'{label:>12} {elapsed:>8.2f} с {peak / 2 ** 20:>9.1f} МБ {peak / count:>10.0f} Б '
+                f'{page_size / 1024:>13.1f} КБ'
+            )
+        full, listing = results[0][1], results[1][1]
+        self.stdout.write(self.style.SUCCESS(
+            f'Память: в {full[1] / listing[1]:.1f} раза меньше, кэш страницы: в {full[2] / listing[2]:.1f} раза меньше'
+        ))
+
+    def _measure(self, queryset, page_size):
+        """Время, пиковая память на загрузку всех продуктов и размер страницы в pickle"""
+        # Время - отдельным проходом: tracemalloc сильно замедляет выполнение
+        started = time.perf_counter()
+        list(queryset.all())
+        elapsed = time.perf_counter() - started
+
+        tracemalloc.start()
+        products = list(queryset.all())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return elapsed, peak, len(pickle.dumps(products[:page_size]))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products import similarity
+
+
+class Command(BaseCommand):
+    help = 'Расчёт похожих продуктов по содержимому (TF-IDF)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Пересчитать только продукты, чей текст изменился после последнего расчёта, '
+                 'и тех, чьи соседи от этого могут измениться. Сдвиг IDF остальных термов '
+                 'не учитывается - его исправляет полный пересчёт'
+        )
+        parser.add_argument('--top-k', type=int, default=similarity.TOP_K, help='Количество соседей')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = similarity.rebuild(incremental=options['incremental'], top_k=options['top_k'])
+        if options['incremental'] and not total:
+            self.stdout.write(self.style.SUCCESS('Изменённых продуктов нет'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Рассчитаны похожие продукты для {total} продуктов за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,72 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts.models import User
+from products.cache import invalidate_products
+from products.models import ProductImage
+from products.storage import ContentAddressedStorage, is_hashed_name
+
+
+class Command(BaseCommand):
+    help = 'Перенос медиафайлов в хранилище по хэшу содержимого с объединением одинаковых файлов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-originals',
+            action='store_true',
+            help='Не удалять старые файлы после переноса'
+        )
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError('В STORAGES["default"] должно быть указано products.storage.ContentAddressedStorage')
+
+        self.converted = {}
+        self.missing = 0
+        product_ids = set()
+
+        for image in ProductImage.objects.order_by('pk'):
+            with transaction.atomic():
+                source = image.image.name
+                image.image.name = self._convert(source)
+                if image.variants.get('source') == source:
+                    image.variants['source'] = image.image.name
+                for variant in image.variants.get('sizes', {}).values():
+                    for image_format in ('webp', 'jpeg'):
+                        if variant.get(image_format):
+                            variant[image_format] = self._convert(variant[image_format])
+                ProductImage.objects.filter(pk=image.pk).update(image=image.image.name, variants=image.variants)
+            product_ids.add(image.product_id)
+        # UPDATE не вызывает сигналов - кэш продуктов сбрасывается вручную
+        invalidate_products(product_ids)
+
+        for user in User.objects.exclude(avatar='').order_by('pk'):
+            with transaction.atomic():
+                User.objects.filter(pk=user.pk).update(avatar=self._convert(user.avatar.name))
+
+        removed = 0
+        if not options['keep_originals']:
+            for name in self.converted:
+                default_storage.delete(name)
+                removed += 1
+
+        blobs = len(set(self.converted.values()))
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено файлов: {len(self.converted)}, уникальных по содержимому: {blobs}, '
+            f'удалено старых: {removed}, не найдено: {self.missing}'
+        ))
+
+    def _convert(self, name):
+        """Имя файла в новом хранилище; каждый вызов - одна ссылка на файл"""
+        if not name or is_hashed_name(name):
+            return name
+        if not default_storage.exists(name):
+            self.stderr.write(f'Файл не найден: {name}')
+            self.missing += 1
+            return name
+
+        with default_storage.open(name, 'rb') as file:
+            new_name = default_storage.save(name, file)
+        self.converted[name] = new_name
+        return new_name
@@ -1,5 +1,5 @@
 from django.core.management.base import BaseCommand
-from products.models import Category, Product, ProductImage
+from products.models import Brand, Category, Product, ProductImage
 from accounts.models import User
 
 
@@ -93,7 +93,7 @@ class Command(BaseCommand):
                 name=prod_data['name'],
                 category=category,
                 defaults={
-                    'brand': prod_data.get('brand', ''),
+                    'brand': Brand.for_name(prod_data.get('brand')),
                     'price': prod_data['price'],
                     'unit': prod_data.get('unit', 'pcs'),
                     'quantity': prod_data.get('quantity', 1),
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products import search
+
+
+class Command(BaseCommand):
+    help = 'Полная перестройка поискового индекса каталога'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Размер пачки продуктов')
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('Поисковый индекс не найден. Выполните python manage.py migrate')
+
+        self.stdout.write('Перестройка поискового индекса...')
+        total = search.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано продуктов: {total}'))
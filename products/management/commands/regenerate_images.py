@@ -0,0 +1,37 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from products import images
+from products.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Построение уменьшенных копий изображений продуктов (WebP/JPEG, LQIP) на всех ядрах'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Количество процессов (по умолчанию - по числу ядер)'
+        )
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help='Обработать только изображения, для которых копии ещё не построены'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        product_images = list(ProductImage.objects.exclude(image='').order_by('pk'))
+        if options['missing']:
+            product_images = [image for image in product_images if not image.has_variants]
+
+        self.stdout.write(f'Изображений к обработке: {len(product_images)}')
+        processed = images.process_images(product_images, workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {processed} за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+# Имя таблицы зафиксировано здесь, а не импортируется из products.search:
+# миграция не должна зависеть от текущего кода приложения
+SEARCH_TABLE = 'products_search'
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Таблица индекса. Заполняется после migrate (сигнал post_migrate,
+    см. products/signals.py): нормализация текстов - код приложения, а не
+    SQL; дальше индекс обновляется сигналами.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+            f"name, brand, category, description, prefix='2 3')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE TABLE {SEARCH_TABLE} ('
+            f'product_id bigint PRIMARY KEY REFERENCES products_product (id) ON DELETE CASCADE, '
+            f'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX {SEARCH_TABLE}_document_gin '
+            f'ON {SEARCH_TABLE} USING gin (document)'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_rename_products_produc_categor_c873ce_idx_products_pr_categor_cd4531_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_main_image(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductImage = apps.get_model('products', 'ProductImage')
+    main_image = ProductImage.objects.filter(
+        product=OuterRef('pk')
+    ).order_by('-is_main', 'order', 'pk').values('pk')[:1]
+    Product.objects.update(main_image=Subquery(main_image))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='main_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='products.productimage', verbose_name='Главное изображение'),
+        ),
+        migrations.RunPython(fill_main_image, migrations.RunPython.noop),
+    ]
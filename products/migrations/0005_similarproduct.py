@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_main_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Позиция')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Дата расчёта')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_links', to='products.product', verbose_name='Продукт')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product', verbose_name='Похожий продукт')),
+            ],
+            options={
+                'verbose_name': 'Похожий продукт',
+                'verbose_name_plural': 'Похожие продукты',
+                'ordering': ['product', 'rank'],
+                'indexes': [models.Index(fields=['product', 'rank'], name='products_si_product_b6dc42_idx')],
+                'unique_together': {('product', 'similar')},
+            },
+        ),
+    ]
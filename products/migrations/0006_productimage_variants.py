@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_similarproduct'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='lqip',
+            field=models.TextField(blank=True, editable=False, verbose_name='Превью-заглушка (data URI)'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Варианты размеров'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:58
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.math
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_mediablob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast('price', models.FloatField()), '*', django.db.models.expressions.CombinedExpression(models.Value(100), '-', models.Case(models.When(discount_percent__gt=0, then=models.F('discount_percent')), default=models.Value(0)))), '*', models.Value(0.01)), 2, output_field=models.DecimalField(decimal_places=2, max_digits=10)), output_field=models.DecimalField(decimal_places=2, max_digits=10), verbose_name='Цена со скидкой'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='unit_price',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(quantity__gt=0, then=django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast('price', models.FloatField()), '*', django.db.models.expressions.CombinedExpression(models.Value(100), '-', models.Case(models.When(discount_percent__gt=0, then=models.F('discount_percent')), default=models.Value(0)))), '*', models.Value(0.01)), '/', django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast('quantity', models.FloatField()), '*', models.Case(models.When(then=models.Value(0.001), unit__in=['g', 'ml']), default=models.Value(1.0)))), 2, output_field=models.DecimalField(decimal_places=2, max_digits=12))), default=django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast('price', models.FloatField()), '*', django.db.models.expressions.CombinedExpression(models.Value(100), '-', models.Case(models.When(discount_percent__gt=0, then=models.F('discount_percent')), default=models.Value(0)))), '*', models.Value(0.01)), 2, output_field=models.DecimalField(decimal_places=2, max_digits=10)), output_field=models.DecimalField(decimal_places=2, max_digits=12)), output_field=models.DecimalField(decimal_places=2, max_digits=12), verbose_name='Цена за кг/л/шт'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['effective_price'], name='products_pr_effecti_8ce082_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['unit_price'], name='products_pr_unit_pr_4a871b_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_paths(apps, schema_editor):
+    # До миграции все категории - корневые
+    Category = apps.get_model('products', 'Category')
+    for category in Category.objects.only('pk'):
+        Category.objects.filter(pk=category.pk).update(path=f'{category.pk:06d}.', depth=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Уровень вложенности'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='children', to='products.category', verbose_name='Родительская категория'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255, verbose_name='Путь в дереве'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_category_tree'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Brand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Название')),
+                ('slug', models.SlugField(allow_unicode=True, max_length=120, unique=True, verbose_name='URL')),
+                ('key', models.CharField(editable=False, max_length=100, unique=True, verbose_name='Ключ для поиска дублей')),
+            ],
+            options={
+                'verbose_name': 'Производитель',
+                'verbose_name_plural': 'Производители',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RenameField(
+            model_name='product',
+            old_name='brand',
+            new_name='brand_name',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='brand',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='products', to='products.brand', verbose_name='Производитель'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+import re
+from collections import Counter, defaultdict
+
+from django.db import migrations
+from django.utils.text import slugify
+
+# Копия products.models.brand_key на момент миграции: последующие
+# изменения модели не должны менять результат миграции
+BRAND_KEY_RE = re.compile(r'[0-9a-zа-я]+')
+
+
+def brand_key(name):
+    return ' '.join(BRAND_KEY_RE.findall((name or '').lower().replace('ё', 'е')))
+
+
+def create_brands(apps, schema_editor):
+    """Производители из строк Product.brand_name; написания одного производителя объединяются"""
+    Brand = apps.get_model('products', 'Brand')
+    Product = apps.get_model('products', 'Product')
+
+    spellings = defaultdict(Counter)
+    raw_names = defaultdict(set)
+    for name in Product.objects.exclude(brand_name='').values_list('brand_name', flat=True).iterator():
+        key = brand_key(name)
+        if key:
+            spellings[key][name.strip()] += 1
+            raw_names[key].add(name)
+
+    slugs = set()
+    for key, names in spellings.items():
+        # Название - самое частое написание; при равенстве - без кавычек и не капслоком
+        name = min(names, key=lambda name: (
+            -names[name], name != name.strip('«»"\''), name.isupper(), name
+        ))
+        base = slugify(name, allow_unicode=True) or 'brand'
+        slug, suffix = base, 2
+        while slug in slugs:
+            slug, suffix = f'{base}-{suffix}', suffix + 1
+        slugs.add(slug)
+
+        brand = Brand.objects.create(name=name, slug=slug, key=key)
+        Product.objects.filter(brand_name__in=raw_names[key]).update(brand=brand)
+
+
+def restore_brand_names(apps, schema_editor):
+    Brand = apps.get_model('products', 'Brand')
+    Product = apps.get_model('products', 'Product')
+    for brand in Brand.objects.all():
+        Product.objects.filter(brand=brand).update(brand_name=brand.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_brand'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_brands, restore_brand_names),
+    ]
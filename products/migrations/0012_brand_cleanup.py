@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_brand_data'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='product',
+            name='brand_name',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['brand', 'is_available'], name='products_pr_brand_i_7df215_idx'),
+        ),
+    ]
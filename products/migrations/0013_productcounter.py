@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_brand_cleanup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCounter',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counter', serialize=False, to='products.product', verbose_name='Продукт')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Просмотров')),
+                ('purchases', models.PositiveIntegerField(default=0, verbose_name='Покупок')),
+                ('score', models.FloatField(blank=True, db_index=True, null=True, verbose_name='Популярность')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Счётчики продукта',
+                'verbose_name_plural': 'Счётчики продуктов',
+                'ordering': ['-score'],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_productcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityState',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='similarity_state', serialize=False, to='products.product', verbose_name='Продукт')),
+                ('digest', models.CharField(max_length=32, verbose_name='Отпечаток текста')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Дата расчёта')),
+            ],
+            options={
+                'verbose_name': 'Состояние расчёта похожих',
+                'verbose_name_plural': 'Состояния расчёта похожих',
+            },
+        ),
+    ]
@@ -1,6 +1,19 @@
-from django.db import models
+import re
+
+from django.db import models, transaction
+from django.db.models import Case, DecimalField, F, FloatField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Cast, Concat, Round, Substr
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
 from django.urls import reverse
+from django.utils.text import slugify
+
+from .cache import update_products
+
+
+# Длина сегмента материализованного пути: id категории с ведущими нулями
+PATH_SEGMENT_LENGTH = 6
 
 
 class Category(models.Model):
@@ -9,6 +22,19 @@ class Category(models.Model):
     slug = models.SlugField('URL', unique=True)
     icon = models.CharField('Иконка (emoji)', max_length=10, default='🛒')
     description = models.TextField('Описание', blank=True)
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.PROTECT,
+        related_name='children',
+        verbose_name='Родительская категория',
+        blank=True,
+        null=True
+    )
+
+    # Материализованный путь - id предков и самой категории: «000001.000007.».
+    # Поддерево категории - все категории, чей путь начинается с её пути
+    path = models.CharField('Путь в дереве', max_length=255, db_index=True, editable=False, default='')
+    depth = models.PositiveSmallIntegerField('Уровень вложенности', default=0, editable=False)
 
     class Meta:
         verbose_name = 'Категория'
@@ -18,6 +44,152 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    @property
+    def tree_name(self):
+        """Название с отступом по уровню вложенности (для выпадающих списков)"""
+        return f'{"— " * self.depth}{self.name}'
+
+    def _build_path(self):
+        parent_path = self.parent.path if self.parent_id else ''
+        return f'{parent_path}{self.pk:0{PATH_SEGMENT_LENGTH}d}.'
+
+    def clean(self):
+        if self.parent_id and self.pk and self.parent.path.startswith(self.path):
+            raise ValidationError({'parent': 'Категорию нельзя вложить в неё саму или в её подкатегорию'})
+
+    def save(self, *args, **kwargs):
+        old_path = self.path
+        with transaction.atomic():
+            if self.pk is None:
+                # Путь включает id, поэтому новая категория сохраняется дважды
+                super().save(*args, **kwargs)
+                kwargs.pop('force_insert', None)
+            self.path = self._build_path()
+            self.depth = self.path.count('.') - 1
+            super().save(*args, **kwargs)
+
+            # Категория перенесена - пути всех её потомков меняются одним UPDATE
+            if old_path and old_path != self.path:
+                Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(self.path), Substr('path', len(old_path) + 1)),
+                    depth=F('depth') + (self.depth - old_path.count('.') + 1),
+                )
+
+    def get_descendants(self, include_self=True):
+        """Поддерево категории одним запросом по префиксу пути"""
+        descendants = Category.objects.filter(path__startswith=self.path)
+        if not include_self:
+            descendants = descendants.exclude(pk=self.pk)
+        return descendants
+
+
+BRAND_KEY_RE = re.compile(r'[0-9a-zа-я]+')
+
+
+def brand_key(name):
+    """Ключ производителя: регистр, ё/е, кавычки и пробелы не различаются"""
+    return ' '.join(BRAND_KEY_RE.findall((name or '').lower().replace('ё', 'е')))
+
+
+class Brand(models.Model):
+    """Модель производителя"""
+    name = models.CharField('Название', max_length=100)
+    slug = models.SlugField('URL', max_length=120, unique=True, allow_unicode=True)
+    # «Простоквашино», «ПРОСТОКВАШИНО» и «"Простоквашино"» - один производитель
+    key = models.CharField('Ключ для поиска дублей', max_length=100, unique=True, editable=False)
+
+    class Meta:
+        verbose_name = 'Производитель'
+        verbose_name_plural = 'Производители'
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        # key не редактируется в формах, поэтому его уникальность форма не проверяет
+        key = brand_key(self.name)
+        if not key:
+            raise ValidationError({'name': 'Название должно содержать буквы или цифры'})
+        duplicate = Brand.objects.filter(key=key).exclude(pk=self.pk).first()
+        if duplicate is not None:
+            raise ValidationError({'name': f'Производитель «{duplicate.name}» уже есть - это то же название в другом написании'})
+
+    def save(self, *args, **kwargs):
+        self.key = brand_key(self.name)
+        if not self.slug:
+            self.slug = self._unique_slug()
+        super().save(*args, **kwargs)
+
+    def _unique_slug(self):
+        base = slugify(self.name, allow_unicode=True) or 'brand'
+        slug, suffix = base, 2
+        while Brand.objects.filter(slug=slug).exclude(pk=self.pk).exists():
+            slug, suffix = f'{base}-{suffix}', suffix + 1
+        return slug
+
+    @classmethod
+    def for_name(cls, name):
+        """Производитель по названию в любом написании (создаётся при необходимости) или None"""
+        name = (name or '').strip()
+        key = brand_key(name)
+        if not key:
+            return None
+        brand, _ = cls.objects.get_or_create(key=key, defaults={'name': name})
+        return brand
+
+
+# Тяжёлые описательные поля продукта: нужны только детальной странице,
+# редактированию и поисковому индексу, но не спискам и карточкам
+HEAVY_FIELDS = (
+    'description',
+    'ingredients',
+    'nutritional_value',
+    'country_origin',
+    'expiry_date',
+    'storage_conditions',
+)
+
+
+def heavy_fields(prefix=''):
+    """Тяжёлые поля для .defer() в запросах через связь (prefix='product__')"""
+    return [prefix + field for field in HEAVY_FIELDS]
+
+
+class ProductQuerySet(models.QuerySet):
+    """Запросы продуктов"""
+
+    def for_listing(self):
+        """Продукты для списков и карточек - без тяжёлых текстовых полей"""
+        return self.defer(*HEAVY_FIELDS)
+
+
+def _discounted_price():
+    """Цена со скидкой, как Product.final_price, в SQL (с плавающей точкой)"""
+    discount = Case(When(discount_percent__gt=0, then=F('discount_percent')), default=Value(0))
+    # Вычисления в REAL: SQLite хранит целые значения NUMERIC-колонок как
+    # INTEGER, и деление цены на количество было бы целочисленным
+    return Cast('price', FloatField()) * (100 - discount) * Value(0.01)
+
+
+def _effective_price():
+    return Round(_discounted_price(), 2, output_field=DecimalField(max_digits=10, decimal_places=2))
+
+
+def _unit_price():
+    """Цена за кг или литр (для штучных товаров - за штуку)"""
+    # Граммы и миллилитры переводятся в килограммы и литры
+    multiplier = Case(When(unit__in=['g', 'ml'], then=Value(0.001)), default=Value(1.0))
+    return Case(
+        When(quantity__gt=0, then=Round(
+            _discounted_price() / (Cast('quantity', FloatField()) * multiplier),
+            2,
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )),
+        default=_effective_price(),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
 
 class Product(models.Model):
     """Модель продукта"""
@@ -37,7 +209,14 @@ class Product(models.Model):
         verbose_name='Категория'
     )
     name = models.CharField('Название', max_length=200)
-    brand = models.CharField('Производитель', max_length=100, blank=True)
+    brand = models.ForeignKey(
+        Brand,
+        on_delete=models.SET_NULL,
+        related_name='products',
+        verbose_name='Производитель',
+        blank=True,
+        null=True
+    )
     price = models.DecimalField('Цена', max_digits=10, decimal_places=2)
 
     # Единица измерения и количество
@@ -75,17 +254,48 @@ class Product(models.Model):
     is_new = models.BooleanField('Новинка', default=False)
     is_organic = models.BooleanField('Органический продукт', default=False)
 
+    # Цены для сортировки и фильтров, считаются базой при каждом изменении строки
+    effective_price = models.GeneratedField(
+        verbose_name='Цена со скидкой',
+        expression=_effective_price(),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
+    unit_price = models.GeneratedField(
+        verbose_name='Цена за кг/л/шт',
+        expression=_unit_price(),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        db_persist=True,
+    )
+
+    # Главное изображение - хранится, чтобы списки не делали запрос на каждую карточку.
+    # Поддерживается ProductImage.save и сигналом удаления изображения
+    main_image = models.ForeignKey(
+        'ProductImage',
+        on_delete=models.SET_NULL,
+        related_name='+',
+        verbose_name='Главное изображение',
+        blank=True,
+        null=True,
+        editable=False
+    )
+
     # Даты
     created_at = models.DateTimeField('Дата добавления', auto_now_add=True)
     updated_at = models.DateTimeField('Дата обновления', auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Продукт'
         verbose_name_plural = 'Продукты'
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['category', 'name']),
+            models.Index(fields=['brand', 'is_available']),
             models.Index(fields=['price']),
+            models.Index(fields=['effective_price']),
+            models.Index(fields=['unit_price']),
             models.Index(fields=['is_available']),
         ]
 
@@ -95,10 +305,13 @@ class Product(models.Model):
     def get_absolute_url(self):
         return reverse('products:detail', kwargs={'pk': self.pk})
 
-    @property
-    def main_image(self):
-        """Получить главное изображение"""
-        return self.images.filter(is_main=True).first() or self.images.first()
+    @staticmethod
+    def refresh_main_images(product_ids):
+        """Пересчитать главное изображение продуктов одним UPDATE"""
+        main_image = ProductImage.objects.filter(
+            product=OuterRef('pk')
+        ).order_by('-is_main', 'order', 'pk').values('pk')[:1]
+        update_products(Product.objects.filter(pk__in=product_ids), main_image=Subquery(main_image))
 
     @property
     def final_price(self):
@@ -120,6 +333,10 @@ class ProductImage(models.Model):
     is_main = models.BooleanField('Главное изображение', default=False)
     order = models.IntegerField('Порядок', default=0)
     uploaded_at = models.DateTimeField('Дата загрузки', auto_now_add=True)
+    # Уменьшенные копии (см. products/images.py):
+    # {'source': исходный файл, 'sizes': {'thumb': {'width', 'height', 'webp', 'jpeg'}, ...}}
+    variants = models.JSONField('Варианты размеров', default=dict, blank=True, editable=False)
+    lqip = models.TextField('Превью-заглушка (data URI)', blank=True, editable=False)
 
     class Meta:
         verbose_name = 'Изображение продукта'
@@ -129,11 +346,129 @@ class ProductImage(models.Model):
     def __str__(self):
         return f"Изображение {self.product}"
 
+    @property
+    def has_variants(self):
+        """Варианты построены для текущего файла"""
+        return bool(self.image) and self.variants.get('source') == self.image.name
+
+    def _variant_url(self, size):
+        if not self.has_variants:
+            return self.image.url
+        return default_storage.url(self.variants['sizes'][size]['jpeg'])
+
+    def _srcset(self, image_format):
+        if not self.has_variants:
+            return ''
+        return ', '.join(
+            f"{default_storage.url(variant[image_format])} {variant['width']}w"
+            for variant in self.variants['sizes'].values()
+        )
+
+    @property
+    def thumb_url(self):
+        return self._variant_url('thumb')
+
+    @property
+    def card_url(self):
+        return self._variant_url('card')
+
+    @property
+    def full_url(self):
+        return self._variant_url('full')
+
+    @property
+    def webp_srcset(self):
+        return self._srcset('webp')
+
+    @property
+    def jpeg_srcset(self):
+        return self._srcset('jpeg')
+
     def save(self, *args, **kwargs):
         # Если это главное изображение, убрать флаг у остальных
         if self.is_main:
             ProductImage.objects.filter(product=self.product, is_main=True).update(is_main=False)
         super().save(*args, **kwargs)
+        Product.refresh_main_images([self.product_id])
+
+
+class SimilarProduct(models.Model):
+    """Похожий продукт, рассчитанный по содержимому (TF-IDF, см. products/similarity.py)"""
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='similar_links',
+        verbose_name='Продукт'
+    )
+    similar = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий продукт'
+    )
+    score = models.FloatField('Сходство')
+    rank = models.PositiveSmallIntegerField('Позиция')
+    computed_at = models.DateTimeField('Дата расчёта', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Похожий продукт'
+        verbose_name_plural = 'Похожие продукты'
+        ordering = ['product', 'rank']
+        unique_together = ['product', 'similar']
+        indexes = [
+            models.Index(fields=['product', 'rank']),
+        ]
+
+    def __str__(self):
+        return f"{self.product} ~ {self.similar} ({self.score:.2f})"
+
+
+class SimilarityState(models.Model):
+    """
+    Отпечаток текста продукта, по которому последний раз считались его
+    соседи (см. products/similarity.py). Не зависит от updated_at:
+    изменение остатка или цены не требует пересчёта.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='similarity_state',
+        verbose_name='Продукт'
+    )
+    digest = models.CharField('Отпечаток текста', max_length=32)
+    computed_at = models.DateTimeField('Дата расчёта', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Состояние расчёта похожих'
+        verbose_name_plural = 'Состояния расчёта похожих'
+
+    def __str__(self):
+        return f"{self.product_id}: {self.computed_at:%d.%m.%Y %H:%M}"
+
+
+class ProductCounter(models.Model):
+    """Счётчики просмотров и покупок продукта (см. products/popularity.py)"""
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counter',
+        verbose_name='Продукт'
+    )
+    views = models.PositiveIntegerField('Просмотров', default=0)
+    purchases = models.PositiveIntegerField('Покупок', default=0)
+    # Логарифм суммы весов событий с затуханием, приведённых к общей точке отсчёта
+    score = models.FloatField('Популярность', null=True, blank=True, db_index=True)
+    updated_at = models.DateTimeField('Дата обновления', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Счётчики продукта'
+        verbose_name_plural = 'Счётчики продуктов'
+        ordering = ['-score']
+
+    def __str__(self):
+        return f"{self.product_id}: {self.views} просмотров, {self.purchases} покупок"
 
 
 class Favorite(models.Model):
@@ -160,3 +495,19 @@ class Favorite(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.product}"
+
+
+class MediaBlob(models.Model):
+    """Файл в хранилище по хэшу содержимого (см. products/storage.py)"""
+    name = models.CharField('Путь в хранилище', max_length=255, unique=True)
+    size = models.PositiveBigIntegerField('Размер, байт')
+    refcount = models.PositiveIntegerField('Количество ссылок', default=1)
+    created_at = models.DateTimeField('Дата загрузки', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Файл хранилища'
+        verbose_name_plural = 'Файлы хранилища'
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
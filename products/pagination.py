@@ -0,0 +1,121 @@
+"""
+Курсорная (keyset) пагинация каталога.
+
+Вместо OFFSET следующая страница выбирается условием «после последней
+показанной строки» по ключу активной сортировки с id в качестве
+разрыва ничьих. Глубокие страницы стоят столько же, сколько первая:
+база идёт по индексу сразу к нужной позиции.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from .filters import POPULAR_SORT, RELEVANCE_SORT
+
+PAGE_SIZE = 24
+
+# Ключи упорядочивания для каждой сортировки каталога; последний всегда pk.
+# Сортировка по цене - по цене со скидкой (генерируемые колонки с индексами)
+SORT_KEYS = {
+    '-created_at': ('-created_at', '-pk'),
+    'price': ('effective_price', 'pk'),
+    '-price': ('-effective_price', '-pk'),
+    'unit_price': ('unit_price', 'pk'),
+    'name': ('name', 'pk'),
+    POPULAR_SORT: ('-popularity', '-pk'),
+    RELEVANCE_SORT: ('search_rank', 'pk'),
+}
+
+
+class InvalidCursor(ValueError):
+    """Курсор повреждён или не соответствует сортировке"""
+
+
+class KeysetPage:
+    """Страница результатов и курсор следующей страницы"""
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _field_name(key):
+    return key.lstrip('-')
+
+
+def _to_python(queryset, name, value):
+    """Привести значение из курсора к типу поля модели"""
+    if name == 'pk':
+        return int(value)
+    if name in queryset.query.annotations:
+        return float(value)
+    return queryset.model._meta.get_field(name).to_python(value)
+
+
+def encode_cursor(sort, values):
+    payload = json.dumps([sort, [str(value) for value in values]], ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError, binascii.Error) as exc:
+        raise InvalidCursor(str(exc))
+    if cursor_sort != sort or len(values) != len(SORT_KEYS[sort]):
+        raise InvalidCursor('Курсор не соответствует сортировке')
+    return values
+
+
+def _after(queryset, keys, values):
+    """Условие «строго после» позиции values при упорядочивании keys"""
+    condition = Q()
+    equal = {}
+    for key, value in zip(keys, values):
+        name = _field_name(key)
+        lookup = 'lt' if key.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+def paginate(queryset, sort, cursor=None, per_page=PAGE_SIZE):
+    """Страница queryset после cursor при сортировке sort"""
+    keys = SORT_KEYS[sort]
+    queryset = queryset.order_by(*keys)
+
+    if cursor:
+        raw_values = decode_cursor(cursor, sort)
+        try:
+            values = [
+                _to_python(queryset, _field_name(key), value)
+                for key, value in zip(keys, raw_values)
+            ]
+        except (ValueError, TypeError, ValidationError) as exc:
+            raise InvalidCursor(str(exc))
+        queryset = queryset.filter(_after(queryset, keys, values))
+
+    rows = list(queryset[:per_page + 1])
+    object_list = rows[:per_page]
+
+    next_cursor = None
+    if len(rows) > per_page:
+        last = object_list[-1]
+        next_cursor = encode_cursor(sort, [
+            getattr(last, _field_name(key)) for key in keys
+        ])
+    return KeysetPage(object_list, next_cursor)
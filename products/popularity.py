@@ -0,0 +1,176 @@
+"""
+Популярность продуктов.
+
+Просмотры детальной страницы и покупки накапливаются в памяти процесса
+и записываются в таблицу ProductCounter пачкой - раз в FLUSH_INTERVAL
+секунд или после FLUSH_EVENTS событий, - поэтому просмотр страницы не
+пишет в базу. Остаток записывается при завершении процесса.
+
+Первое событие после записи заводит таймер на FLUSH_INTERVAL секунд,
+так что события записываются и тогда, когда новых больше нет
+(см. freshmarket/writebehind.py).
+
+После развёртывания таблица пуста, пока не накопятся события; команда
+seed_popularity заполняет её покупками из истории заказов (seed).
+
+Из счётчиков считается «трендовость» - сумма весов событий, которая
+уменьшается вдвое за HALF_LIFE_DAYS дней. Чтобы не пересчитывать все
+продукты с течением времени, хранится логарифм суммы весов, приведённых
+к общей точке отсчёта EPOCH:
+
+    score = ln Σ w·e^(λ·t),  λ = ln 2 / HALF_LIFE_DAYS, t - дни от EPOCH
+
+Порядок по score в любой момент совпадает с порядком по текущей
+затухшей сумме (decayed), а новое событие меняет только score своего
+продукта.
+"""
+import datetime
+import logging
+import math
+from collections import Counter
+
+from django.db import DatabaseError, transaction
+from django.db.models import FloatField, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from freshmarket.writebehind import WriteBehind
+
+from .cache import POPULARITY, invalidate
+from .models import Product, ProductCounter
+
+logger = logging.getLogger(__name__)
+
+HALF_LIFE_DAYS = 7
+DECAY_RATE = math.log(2) / HALF_LIFE_DAYS
+
+EPOCH = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+# Покупка говорит о популярности больше, чем просмотр
+VIEW_WEIGHT = 1
+PURCHASE_WEIGHT = 10
+
+FLUSH_INTERVAL = 30
+FLUSH_EVENTS = 500
+
+
+def _days(moment):
+    return (moment - EPOCH).total_seconds() / 86400
+
+
+def _log_add(a, b):
+    """ln(e^a + e^b) без переполнения"""
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def decayed(score, now=None):
+    """Сумма весов событий с затуханием на момент now"""
+    if score is None:
+        return 0.0
+    return math.exp(score - DECAY_RATE * _days(now or timezone.now()))
+
+
+def annotate_popularity(queryset):
+    """Аннотация popularity для сортировки; без событий - 0 (ниже любого score)"""
+    return queryset.annotate(popularity=Coalesce('counter__score', Value(0.0), output_field=FloatField()))
+
+
+_views = Counter()
+_purchases = Counter()
+
+
+def _record(counter, product_ids):
+    with _buffer.lock:
+        counter.update(product_ids)
+    _buffer.added(len(product_ids))
+
+
+def record_view(product_id):
+    """Учесть просмотр продукта"""
+    _record(_views, [product_id])
+
+
+def record_purchases(product_ids):
+    """Учесть покупку продуктов (по одной на каждый id)"""
+    _record(_purchases, product_ids)
+
+
+def flush():
+    """Записать накопленные счётчики в базу. Возвращает количество продуктов"""
+    global _views, _purchases
+    with _buffer.lock:
+        views, purchases = _views, _purchases
+        _views, _purchases = Counter(), Counter()
+        _buffer.taken()
+
+    if not views and not purchases:
+        return 0
+
+    now = timezone.now()
+    # События между сбросами считаются случившимися в момент сброса:
+    # интервал несравнимо меньше периода полураспада
+    moment = DECAY_RATE * _days(now)
+    try:
+        with transaction.atomic():
+            # Продукты могли удалить, пока события копились
+            product_ids = list(Product.objects.filter(pk__in=set(views) | set(purchases)).values_list('pk', flat=True))
+            ProductCounter.objects.bulk_create(
+                [ProductCounter(product_id=pk) for pk in product_ids],
+                ignore_conflicts=True,
+            )
+            counters = list(ProductCounter.objects.select_for_update().filter(product_id__in=product_ids))
+            for counter in counters:
+                viewed, bought = views[counter.product_id], purchases[counter.product_id]
+                counter.views += viewed
+                counter.purchases += bought
+                event = math.log(viewed * VIEW_WEIGHT + bought * PURCHASE_WEIGHT) + moment
+                counter.score = event if counter.score is None else _log_add(counter.score, event)
+                counter.updated_at = now
+            ProductCounter.objects.bulk_update(counters, ['views', 'purchases', 'score', 'updated_at'])
+    except DatabaseError:
+        logger.exception('Не удалось записать счётчики популярности')
+        # Вернуть события в буфер до следующей попытки
+        with _buffer.lock:
+            _views.update(views)
+            _purchases.update(purchases)
+            _buffer.failed()
+        return 0
+
+    invalidate(POPULARITY)
+    return len(counters)
+
+
+_buffer = WriteBehind(flush, FLUSH_INTERVAL, FLUSH_EVENTS, 'счётчики популярности')
+
+
+def seed(purchases):
+    """
+    Заполнить счётчики продуктов без событий покупками из истории:
+    purchases - пары (id продукта, момент покупки). Продукты, для которых
+    счётчики уже есть, не меняются, так что повторный запуск ничего не
+    удваивает. Возвращает количество созданных счётчиков.
+    """
+    bought = Counter()
+    scores = {}
+    event = math.log(PURCHASE_WEIGHT)
+    for product_id, moment in purchases:
+        bought[product_id] += 1
+        score = event + DECAY_RATE * _days(moment)
+        scores[product_id] = score if product_id not in scores else _log_add(scores[product_id], score)
+
+    with transaction.atomic():
+        existing = set(ProductCounter.objects.filter(product_id__in=scores).values_list('product_id', flat=True))
+        product_ids = set(Product.objects.filter(pk__in=scores).values_list('pk', flat=True)) - existing
+        # ignore_conflicts - на случай сброса счётчиков, идущего параллельно
+        created = ProductCounter.objects.bulk_create(
+            [
+                ProductCounter(product_id=pk, purchases=bought[pk], score=scores[pk])
+                for pk in product_ids
+            ],
+            ignore_conflicts=True,
+        )
+
+    invalidate(POPULARITY)
+    return len(created)
+
@@ -0,0 +1,245 @@
+"""
+Полнотекстовый поиск по каталогу.
+
+Индекс хранится в отдельной таблице ``products_search``:
+- на SQLite это виртуальная таблица FTS5 (rowid = id продукта);
+- на PostgreSQL - таблица с колонкой tsvector и GIN-индексом.
+
+Тексты перед индексацией нормализуются (регистр, ё/е, русские окончания),
+поэтому «Молоко», «молока» и «молоком» находят друг друга.
+Индекс обновляется сигналами (см. products/signals.py), полная
+перестройка - командой ``python manage.py rebuild_search_index``.
+Пустой индекс при непустом каталоге (первая миграция на базе с данными)
+заполняется сразу после migrate.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.sql.datastructures import INNER, Join
+
+SEARCH_TABLE = 'products_search'
+
+# Псевдоним производного запроса с рангами совпадений в запросе продуктов
+MATCHES_ALIAS = 'products_search_matches'
+
+# Веса колонок: название важнее производителя, категории и описания
+FTS5_WEIGHTS = (10.0, 5.0, 3.0, 1.0)
+
+WORD_RE = re.compile(r'[0-9a-zа-я]+')
+
+# Окончания русских слов, отсортированные от длинных к коротким
+RUSSIAN_ENDINGS = sorted([
+    # прилагательные и причастия
+    'ыми', 'ими', 'ого', 'его', 'ому', 'ему', 'ая', 'яя', 'ое', 'ее',
+    'ые', 'ие', 'ый', 'ий', 'ой', 'ую', 'юю', 'ым', 'им', 'ых', 'их',
+    # существительные
+    'иями', 'ями', 'ами', 'иях', 'иям', 'ией', 'ах', 'ях', 'ов', 'ев',
+    'ей', 'ам', 'ям', 'ом', 'ем', 'ию', 'ия', 'ье', 'ья',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'й', 'у', 'ю', 'ь',
+], key=len, reverse=True)
+
+MIN_STEM_LENGTH = 3
+
+
+def stem(word):
+    """Отрезать типичное русское окончание, оставив основу не короче 3 букв"""
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    """Нормализованные основы слов текста"""
+    text = (text or '').lower().replace('ё', 'е')
+    return [stem(word) for word in WORD_RE.findall(text)]
+
+
+def normalize(text):
+    """Нормализованный текст для записи в индекс"""
+    return ' '.join(tokenize(text))
+
+
+_index_exists = False
+
+
+def is_available(refresh=False):
+    """
+    Существует ли таблица индекса в текущей базе данных. Найденная таблица
+    запоминается; refresh - проверить заново (миграции могли её удалить).
+    """
+    global _index_exists
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        return False
+    if refresh or not _index_exists:
+        _index_exists = SEARCH_TABLE in connection.introspection.table_names()
+    return _index_exists
+
+
+def is_empty():
+    """Пуст ли индекс"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT 1 FROM {SEARCH_TABLE} LIMIT 1')
+        return cursor.fetchone() is None
+
+
+def _document(product):
+    return (
+        normalize(product.name),
+        normalize(product.brand.name if product.brand else ''),
+        normalize(product.category.name),
+        normalize(product.description),
+    )
+
+
+def index_products(products):
+    """Добавить или обновить продукты в индексе"""
+    products = list(products)
+    if not products or not is_available():
+        return
+
+    rows = [(product.pk, *_document(product)) for product in products]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+                [(row[0],) for row in rows]
+            )
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, name, brand, category, description) '
+                f'VALUES (%s, %s, %s, %s, %s)',
+                rows
+            )
+        else:
+            cursor.executemany(
+                f"""
+                INSERT INTO {SEARCH_TABLE} (product_id, document)
+                VALUES (%s,
+                    setweight(to_tsvector('russian', %s), 'A') ||
+                    setweight(to_tsvector('russian', %s), 'B') ||
+                    setweight(to_tsvector('russian', %s), 'B') ||
+                    setweight(to_tsvector('russian', %s), 'C'))
+                ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document
+                """,
+                rows
+            )
+
+
+def remove_products(product_ids):
+    """Удалить продукты из индекса"""
+    product_ids = list(product_ids)
+    if not product_ids or not is_available():
+        return
+
+    column = 'rowid' if connection.vendor == 'sqlite' else 'product_id'
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {SEARCH_TABLE} WHERE {column} = %s',
+            [(pk,) for pk in product_ids]
+        )
+
+
+def rebuild(batch_size=500):
+    """Полностью перестроить индекс. Возвращает количество продуктов"""
+    from .models import Product
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+
+    products = Product.objects.select_related('category', 'brand').only(
+        'name', 'brand__name', 'description', 'category__name'
+    ).order_by('pk')
+
+    batch = []
+    total = 0
+    for product in products.iterator(chunk_size=batch_size):
+        batch.append(product)
+        if len(batch) >= batch_size:
+            index_products(batch)
+            total += len(batch)
+            batch = []
+    index_products(batch)
+    return total + len(batch)
+
+
+def _match_expression(query):
+    """Выражение запроса для FTS5 / tsquery из поисковой строки пользователя"""
+    terms = tokenize(query)
+    if not terms:
+        return None
+    if connection.vendor == 'sqlite':
+        return ' AND '.join(f'"{term}"*' for term in terms)
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+class _Matches:
+    """Запрос (product_id, rank) к индексу - «поле связи» для _MatchesJoin"""
+
+    def __init__(self, sql, params):
+        self.sql = sql
+        self.params = params
+
+    def get_joining_fields(self):
+        return ()
+
+
+class _MatchesJoin(Join):
+    """
+    INNER JOIN (SELECT product_id, rank ... MATCH ...) к продуктам.
+    Совпадения и их ранги вычисляются одним запросом к индексу, а не
+    коррелированным подзапросом для каждой строки продуктов.
+    """
+
+    def as_sql(self, compiler, connection):
+        qn = connection.ops.quote_name
+        return (
+            f'{self.join_type} ({self.join_field.sql}) {qn(self.table_alias)} '
+            f'ON ({qn(self.table_alias)}.product_id = {compiler.quote_name_unless_alias(self.parent_alias)}.{qn("id")})',
+            list(self.join_field.params),
+        )
+
+
+def search(queryset, query):
+    """
+    Отфильтровать queryset продуктов по поисковой строке.
+
+    Результат аннотируется полем ``search_rank`` (меньше - релевантнее).
+    Если индекс недоступен, используется поиск по подстроке без ранжирования.
+    """
+    if not is_available():
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(brand__name__icontains=query) |
+            Q(category__name__icontains=query) |
+            Q(description__icontains=query)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    match = _match_expression(query)
+    if match is None:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+
+    if connection.vendor == 'sqlite':
+        weights = ', '.join(str(weight) for weight in FTS5_WEIGHTS)
+        matches_sql = (
+            f'SELECT rowid AS product_id, bm25({SEARCH_TABLE}, {weights}) AS rank '
+            f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+        )
+        params = [match]
+    else:
+        matches_sql = (
+            f"SELECT product_id, -ts_rank(document, to_tsquery('russian', %s)) AS rank "
+            f"FROM {SEARCH_TABLE} WHERE document @@ to_tsquery('russian', %s)"
+        )
+        params = [match, match]
+
+    queryset = queryset.all()
+    sql_query = queryset.query
+    alias = sql_query.join(_MatchesJoin(
+        MATCHES_ALIAS, sql_query.get_initial_alias(), None, INNER, _Matches(matches_sql, params), False,
+    ))
+    # INNER JOIN сам отбирает найденные продукты
+    return queryset.annotate(
+        search_rank=RawSQL(f'{connection.ops.quote_name(alias)}.rank', [])
+    )
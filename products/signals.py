@@ -0,0 +1,96 @@
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_migrate, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from . import images, search
+from .cache import BRAND, CATALOG, CATEGORY, invalidate, invalidate_products
+from .models import Brand, Category, Product, ProductImage
+
+
+@receiver(post_migrate)
+def fill_search_index(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Заполнить пустой индекс после migrate: миграция создаёт только таблицу,
+    а продукты в базе уже могут быть (обновление существующей базы)
+    """
+    if sender.name != 'products' or using != DEFAULT_DB_ALIAS:
+        return
+    if search.is_available(refresh=True) and search.is_empty() and Product.objects.exists():
+        search.rebuild()
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, raw=False, **kwargs):
+    """Обновить продукт в поисковом индексе"""
+    if raw:
+        return
+    search.index_products([instance])
+    invalidate_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    """Удалить продукт из поискового индекса"""
+    search.remove_products([instance.pk])
+    invalidate_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created=False, raw=False, **kwargs):
+    """Название категории входит в индекс - переиндексировать её продукты"""
+    if raw:
+        return
+    if not created:
+        search.index_products(instance.products.select_related('category', 'brand'))
+    invalidate(CATALOG, CATEGORY)
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    """Отметить изменение каталога и дерева категорий"""
+    invalidate(CATALOG, CATEGORY)
+
+
+@receiver(post_save, sender=Brand)
+def brand_saved(sender, instance, created=False, raw=False, **kwargs):
+    """Название производителя входит в индекс - переиндексировать его продукты"""
+    if raw:
+        return
+    if not created:
+        search.index_products(instance.products.select_related('category', 'brand'))
+    invalidate(CATALOG, BRAND)
+
+
+@receiver(pre_delete, sender=Brand)
+def brand_deleting(sender, instance, **kwargs):
+    """Запомнить продукты производителя: после удаления их связь уже обнулена"""
+    instance.product_ids = list(instance.products.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Brand)
+def brand_deleted(sender, instance, **kwargs):
+    """Переиндексировать продукты без производителя"""
+    search.index_products(Product.objects.filter(pk__in=instance.product_ids).select_related('category', 'brand'))
+    invalidate(BRAND)
+    invalidate_products(instance.product_ids)
+
+
+@receiver(post_save, sender=ProductImage)
+def product_image_saved(sender, instance, raw=False, **kwargs):
+    """Построить уменьшенные копии нового файла и отметить изменение каталога"""
+    if raw:
+        return
+    if instance.image and not instance.has_variants:
+        transaction.on_commit(lambda: images.schedule(instance))
+    invalidate_products([instance.product_id])
+
+
+@receiver(post_delete, sender=ProductImage)
+def product_image_deleted(sender, instance, **kwargs):
+    """Выбрать новое главное изображение вместо удалённого и удалить его файлы"""
+    Product.refresh_main_images([instance.product_id])
+    images.delete_variants(instance)
+    # Файл может быть общим для нескольких изображений - хранилище считает ссылки
+    if instance.image:
+        instance.image.delete(save=False)
+    invalidate_products([instance.product_id])
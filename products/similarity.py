@@ -0,0 +1,227 @@
+"""
+Похожие продукты по содержимому.
+
+Каждый продукт описывается вектором TF-IDF по основам слов из названия,
+производителя, категории, описания и состава (нормализация та же, что
+у поиска). Векторы нормированы, поэтому скалярное произведение - это
+косинусное сходство. Матрица хранится в разреженном виде (массивы NumPy
+по столбцам-термам), и для каждого продукта сходство со всем каталогом
+считается одним np.bincount по спискам продуктов его термов.
+
+Результат - top-K соседей на продукт - сохраняется в SimilarProduct,
+и детальная страница читает его одним запросом по индексу.
+
+Для инкрементального пересчёта (stale_product_ids) у каждого продукта
+хранится отпечаток его текста на момент расчёта (SimilarityState).
+Пересчитываются продукты, чей текст изменился, и те, чьи соседи могут
+от этого измениться. Сдвиг IDF остальных термов при этом не учитывается -
+его исправляет полный пересчёт.
+"""
+import hashlib
+
+import numpy as np
+from django.db import transaction
+
+from .cache import invalidate_products
+from .models import Product, SimilarityState, SimilarProduct
+from .search import tokenize
+
+TOP_K = 8
+
+# Во сколько раз слово из поля весомее слова из описания
+FIELD_WEIGHTS = {
+    'name': 3,
+    'brand__name': 2,
+    'category__name': 1,
+    'description': 1,
+    'ingredients': 1,
+}
+
+# Термы, встречающиеся больше чем в этой доле продуктов, не различают их
+MAX_DOCUMENT_FREQUENCY = 0.5
+
+SAVE_BATCH_SIZE = 500
+
+
+class TfidfMatrix:
+    """Нормированная разреженная матрица TF-IDF продуктов"""
+
+    def __init__(self, product_ids, documents):
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        self.position = {pk: index for index, pk in enumerate(product_ids)}
+        n_docs = len(documents)
+
+        vocabulary = {}
+        doc_index = []
+        term_index = []
+        for doc, tokens in enumerate(documents):
+            for token in tokens:
+                doc_index.append(doc)
+                term_index.append(vocabulary.setdefault(token, len(vocabulary)))
+        n_terms = len(vocabulary)
+
+        doc_index = np.asarray(doc_index, dtype=np.int64)
+        term_index = np.asarray(term_index, dtype=np.int64)
+
+        # Частоты термов: уникальные пары (документ, терм) и их количество
+        pairs, tf = np.unique(doc_index * max(n_terms, 1) + term_index, return_counts=True)
+        docs = pairs // max(n_terms, 1)
+        terms = pairs % max(n_terms, 1)
+
+        df = np.bincount(terms, minlength=n_terms)
+        keep = df[terms] <= max(1, MAX_DOCUMENT_FREQUENCY * n_docs)
+        docs, terms, tf = docs[keep], terms[keep], tf[keep]
+
+        idf = np.log((1 + n_docs) / (1 + df)) + 1
+        weights = (1 + np.log(tf)) * idf[terms]
+
+        norms = np.sqrt(np.bincount(docs, weights=weights ** 2, minlength=n_docs))
+        weights = weights / np.where(norms > 0, norms, 1)[docs]
+
+        # Строки (документы) - для векторов продуктов
+        order = np.lexsort((terms, docs))
+        self.row_terms = terms[order]
+        self.row_weights = weights[order]
+        self.row_ptr = np.concatenate(([0], np.cumsum(np.bincount(docs, minlength=n_docs))))
+
+        # Столбцы (термы) - списки продуктов, где встречается терм
+        order = np.lexsort((docs, terms))
+        self.col_docs = docs[order]
+        self.col_weights = weights[order]
+        self.col_ptr = np.concatenate(([0], np.cumsum(np.bincount(terms, minlength=n_terms))))
+
+        self.n_docs = n_docs
+
+    def scores(self, doc):
+        """Косинусное сходство документа doc со всеми документами"""
+        start, end = self.row_ptr[doc], self.row_ptr[doc + 1]
+        terms = self.row_terms[start:end]
+        weights = self.row_weights[start:end]
+        if not len(terms):
+            return np.zeros(self.n_docs)
+
+        starts = self.col_ptr[terms]
+        lengths = self.col_ptr[terms + 1] - starts
+        # Индексы всех элементов списков термов одним массивом
+        offsets = np.repeat(starts - np.cumsum(np.concatenate(([0], lengths[:-1]))), lengths)
+        positions = np.arange(lengths.sum()) + offsets
+        contributions = self.col_weights[positions] * np.repeat(weights, lengths)
+        return np.bincount(self.col_docs[positions], weights=contributions, minlength=self.n_docs)
+
+    def top_k(self, doc, k=TOP_K):
+        """Соседи документа: список (индекс документа, сходство) по убыванию"""
+        scores = self.scores(doc)
+        scores[doc] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(int(index), float(scores[index])) for index in candidates]
+
+
+def _document(row):
+    tokens = []
+    for field, weight in FIELD_WEIGHTS.items():
+        tokens.extend(tokenize(row[field]) * weight)
+    return tokens
+
+
+def _digest(tokens):
+    return hashlib.md5(' '.join(tokens).encode()).hexdigest()
+
+
+def build_matrix():
+    """
+    Матрица TF-IDF по всем доступным продуктам и отпечатки их текстов
+    {id продукта: отпечаток}
+    """
+    rows = Product.objects.filter(is_available=True).order_by('pk').values('pk', *FIELD_WEIGHTS)
+    product_ids = []
+    documents = []
+    digests = {}
+    for row in rows.iterator(chunk_size=2000):
+        document = _document(row)
+        product_ids.append(row['pk'])
+        documents.append(document)
+        digests[row['pk']] = _digest(document)
+    return TfidfMatrix(product_ids, documents), digests
+
+
+def stale_product_ids(matrix, digests, top_k=TOP_K):
+    """
+    Продукты, чьих соседей нужно пересчитать:
+    - ещё не рассчитанные и те, чей текст изменился после расчёта;
+    - те, у кого среди соседей изменённый или ставший недоступным продукт;
+    - те, в чей top-K изменённый продукт теперь попадает: сходство с ним
+      выше, чем у последнего из их соседей (или соседей меньше top_k).
+    """
+    states = dict(SimilarityState.objects.values_list('product_id', 'digest'))
+    changed = [pk for pk, digest in digests.items() if states.get(pk) != digest]
+    removed = set(states) - set(digests)
+
+    stale = set(changed)
+    stale.update(
+        SimilarProduct.objects.filter(similar__in=set(changed) | removed).values_list('product_id', flat=True)
+    )
+    if not changed or len(stale) >= matrix.n_docs:
+        return stale
+
+    # Порог попадания в top-K каждого продукта; 0 - есть свободные места
+    thresholds = np.zeros(matrix.n_docs)
+    links = SimilarProduct.objects.filter(rank=top_k - 1).values_list('product_id', 'score')
+    for pk, score in links.iterator(chunk_size=2000):
+        if pk in matrix.position:
+            thresholds[matrix.position[pk]] = score
+
+    for pk in changed:
+        doc = matrix.position[pk]
+        scores = matrix.scores(doc)
+        scores[doc] = 0
+        stale.update(int(matrix.product_ids[index]) for index in np.flatnonzero(scores > thresholds))
+    return stale
+
+
+def rebuild(incremental=False, top_k=TOP_K):
+    """
+    Пересчитать похожие продукты для всех продуктов или, если incremental,
+    только для устаревших (stale_product_ids). Возвращает количество
+    пересчитанных продуктов.
+    """
+    matrix, digests = build_matrix()
+    if incremental:
+        targets = sorted(stale_product_ids(matrix, digests, top_k))
+    else:
+        targets = list(matrix.product_ids)
+
+    # Недоступные продукты не показываются - их связи и состояние удаляем;
+    # связи на них у остальных продуктов пересчитываются ниже
+    SimilarProduct.objects.exclude(product__is_available=True).delete()
+    SimilarityState.objects.exclude(product__is_available=True).delete()
+
+    for start in range(0, len(targets), SAVE_BATCH_SIZE):
+        batch = targets[start:start + SAVE_BATCH_SIZE]
+        links = []
+        for pk in batch:
+            neighbours = matrix.top_k(matrix.position[pk], top_k)
+            links.extend(
+                SimilarProduct(
+                    product_id=pk,
+                    similar_id=int(matrix.product_ids[index]),
+                    score=score,
+                    rank=rank,
+                )
+                for rank, (index, score) in enumerate(neighbours)
+            )
+        with transaction.atomic():
+            SimilarProduct.objects.filter(product_id__in=batch).delete()
+            SimilarProduct.objects.bulk_create(links)
+            SimilarityState.objects.bulk_create(
+                [SimilarityState(product_id=pk, digest=digests[pk]) for pk in batch],
+                update_conflicts=True,
+                unique_fields=['product'],
+                update_fields=['digest', 'computed_at'],
+            )
+
+    # Похожие продукты входят в ETag детальной страницы
+    invalidate_products(targets)
+    return len(targets)
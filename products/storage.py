@@ -0,0 +1,109 @@
+"""
+Хранилище медиафайлов по хэшу содержимого.
+
+Файл сохраняется под именем из SHA-256 его содержимого в двухуровневой
+структуре каталогов: ``products/ab/cd/abcd….jpg`` (каталог из upload_to
+сохраняется, расширение - из исходного имени). В одном каталоге
+оказывается не больше нескольких сотен файлов даже при миллионах
+изображений, а одинаковые загрузки (одно и то же фото поставщика у
+десятка продуктов) хранятся одним файлом.
+
+На каждый файл ведётся счётчик ссылок (MediaBlob): save увеличивает его,
+delete уменьшает, и файл удаляется с диска, только когда ссылок не
+осталось. Файлы, сохранённые до перехода на это хранилище (без записи
+MediaBlob), удаляются сразу, как в FileSystemStorage.
+"""
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+
+def content_hash(content):
+    """SHA-256 содержимого файла; позиция чтения возвращается в начало"""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def hashed_name(name, digest):
+    """Имя файла в хранилище: каталог upload_to, два уровня по хэшу и расширение"""
+    directory = posixpath.dirname(name)
+    extension = os.path.splitext(name)[1].lower()
+    return posixpath.join(directory, digest[:2], digest[2:4], f'{digest}{extension}')
+
+
+def is_hashed_name(name):
+    """Файл уже хранится по хэшу содержимого"""
+    parts = name.split('/')
+    stem = os.path.splitext(parts[-1])[0]
+    return (
+        len(parts) >= 3
+        and len(stem) == 64
+        and parts[-3] == stem[:2]
+        and parts[-2] == stem[2:4]
+    )
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище с именами по хэшу содержимого и подсчётом ссылок"""
+
+    def _blobs(self):
+        # Хранилище создаётся при загрузке настроек, раньше реестра моделей
+        return apps.get_model('products', 'MediaBlob')._default_manager
+
+    def get_available_name(self, name, max_length=None):
+        # Одинаковое имя - одинаковое содержимое, переименовывать не нужно
+        return name
+
+    def _save(self, name, content):
+        name = hashed_name(name, content_hash(content))
+        full_path = self.path(name)
+
+        if not os.path.exists(full_path):
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            # Запись во временный файл и атомарная замена: параллельная
+            # загрузка того же содержимого не увидит недописанный файл
+            temporary_path = f'{full_path}.{uuid.uuid4().hex}.tmp'
+            with open(temporary_path, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary_path, self.file_permissions_mode)
+            os.replace(temporary_path, full_path)
+
+        self._add_reference(name, os.path.getsize(full_path))
+        return name
+
+    def _add_reference(self, name, size):
+        with transaction.atomic():
+            blob, created = self._blobs().get_or_create(name=name, defaults={'size': size})
+            if not created:
+                self._blobs().filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+
+    def delete(self, name):
+        """Убрать ссылку на файл; файл удаляется, когда ссылок не осталось"""
+        if not name:
+            raise ValueError('The name must be given to delete().')
+
+        with transaction.atomic():
+            if self._blobs().filter(name=name, refcount__gt=1).update(refcount=F('refcount') - 1):
+                return
+            deleted, _ = self._blobs().filter(name=name).delete()
+
+        if deleted or not is_hashed_name(name):
+            # Файл удаляется только если транзакция с удалением ссылки закоммичена
+            transaction.on_commit(lambda: self._remove_file(name))
+
+    def _remove_file(self, name):
+        # Пока удаление ждало коммита, то же содержимое могли загрузить снова
+        if is_hashed_name(name) and self._blobs().filter(name=name).exists():
+            return
+        super().delete(name)
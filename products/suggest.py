@@ -0,0 +1,167 @@
+"""
+Подсказки поиска по мере ввода.
+
+Индекс живёт в памяти процесса: отсортированный список ключей, по
+которому префикс ищется через bisect за O(log n). Ключи - нормализованные
+названия продуктов, производителей и категорий, а также их хвосты,
+начинающиеся с каждого слова («сыр российский» находится и по «росс»).
+Индекс перестраивается, когда меняется версия каталога.
+
+Если запрос набран в латинской раскладке вместо русской («cshjr» вместо
+«сырок»), дополнительно ищется вариант в русской раскладке.
+"""
+import re
+import threading
+from bisect import bisect_left
+from urllib.parse import urlencode
+
+from django.urls import reverse
+
+from .cache import get_catalog_version
+
+# Латинская раскладка QWERTY -> русская ЙЦУКЕН на тех же клавишах
+LAYOUT_MAP = str.maketrans(
+    "qwertyuiop[]asdfghjkl;'zxcvbnm,.`",
+    'йцукенгшщзхъфывапролджэячсмитьбюё',
+)
+
+LATIN_RE = re.compile(r'[a-z]')
+
+MIN_QUERY_LENGTH = 2
+
+# Сколько подсказок каждого вида показывать
+LIMITS = {'product': 8, 'brand': 3, 'category': 3}
+
+# Сколько ключей с подходящим префиксом просматривать для коротких запросов
+MAX_CANDIDATES = 500
+
+
+def normalize(text):
+    return ' '.join((text or '').lower().replace('ё', 'е').split())
+
+
+def switch_layout(text):
+    """Перевести текст, набранный в латинской раскладке, в русскую"""
+    return text.lower().translate(LAYOUT_MAP).replace('ё', 'е')
+
+
+class SuggestIndex:
+    """Префиксный индекс по отсортированному массиву ключей"""
+
+    def __init__(self, entries):
+        """entries - список (kind, label, data); kind: product, brand или category"""
+        self.entries = entries
+        keys = []
+        for entry_id, (kind, label, data) in enumerate(entries):
+            words = normalize(label).split(' ')
+            # Ключ для каждого суффикса, начинающегося со слова; позиция слова - для ранжирования
+            for position in range(len(words)):
+                keys.append((' '.join(words[position:]), position, entry_id))
+        keys.sort()
+        self.keys = keys
+        self.key_strings = [key for key, position, entry_id in keys]
+
+    def lookup(self, prefix):
+        """id записей, у которых есть ключ с префиксом prefix, по релевантности"""
+        start = bisect_left(self.key_strings, prefix)
+        best = {}
+        for key, position, entry_id in self.keys[start:start + MAX_CANDIDATES]:
+            if not key.startswith(prefix):
+                break
+            if entry_id not in best or position < best[entry_id]:
+                best[entry_id] = position
+        # Сначала совпадения с начала названия, затем более короткие названия
+        return sorted(best, key=lambda entry_id: (best[entry_id], len(self.entries[entry_id][1])))
+
+    def suggest(self, query):
+        """Подсказки, сгруппированные по видам"""
+        result = {kind: [] for kind in LIMITS}
+        for entry_id in self.lookup(query):
+            kind, label, data = self.entries[entry_id]
+            if len(result[kind]) < LIMITS[kind]:
+                result[kind].append(data)
+        return result
+
+
+def build_index():
+    """Построить индекс по доступным продуктам, производителям и категориям"""
+    from .models import Brand, Category, Product
+
+    entries = []
+    catalog_url = reverse('products:catalog')
+
+    for category in Category.objects.only('name', 'slug', 'icon'):
+        entries.append(('category', category.name, {
+            'name': category.name,
+            'icon': category.icon,
+            'url': f'{catalog_url}?category={category.slug}',
+        }))
+
+    products = Product.objects.filter(is_available=True).values_list('pk', 'name')
+    for pk, name in products.iterator(chunk_size=2000):
+        entries.append(('product', name, {
+            'id': pk,
+            'name': name,
+            'url': reverse('products:detail', kwargs={'pk': pk}),
+        }))
+
+    # Только производители, у которых есть доступные продукты
+    brands = Brand.objects.filter(products__is_available=True).distinct().only('name', 'slug')
+    for brand in brands:
+        entries.append(('brand', brand.name, {
+            'name': brand.name,
+            'url': f"{catalog_url}?{urlencode({'brand': brand.slug})}",
+        }))
+
+    return SuggestIndex(entries)
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def get_index():
+    """Индекс текущего процесса; перестраивается при смене версии каталога"""
+    global _index, _index_version
+    version = get_catalog_version()
+    if _index is None or _index_version != version:
+        with _lock:
+            if _index is None or _index_version != version:
+                _index = build_index()
+                _index_version = version
+    return _index
+
+
+def suggest(query):
+    """
+    Подсказки для строки запроса.
+
+    Возвращает словарь с группами products, brands, categories и полем
+    corrected - запросом в русской раскладке, если он был исправлен.
+    """
+    query = normalize(query)
+    empty = {'products': [], 'brands': [], 'categories': [], 'corrected': None}
+    if len(query) < MIN_QUERY_LENGTH:
+        return empty
+
+    index = get_index()
+    result = index.suggest(query)
+    corrected = None
+
+    if LATIN_RE.search(query):
+        switched = switch_layout(query)
+        alternative = index.suggest(switched)
+        if any(alternative.values()):
+            corrected = switched
+            for kind, items in alternative.items():
+                seen = {item['url'] for item in result[kind]}
+                extra = [item for item in items if item['url'] not in seen]
+                result[kind] += extra[:LIMITS[kind] - len(result[kind])]
+
+    return {
+        'products': result['product'],
+        'brands': result['brand'],
+        'categories': result['category'],
+        'corrected': corrected,
+    }
@@ -1,10 +1,15 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'products'
 
 urlpatterns = [
     path('', views.catalog_view, name='catalog'),
+    path('catalog/page/', views.catalog_page_view, name='catalog_page'),
     path('<int:pk>/', views.car_detail_view, name='detail'),
     path('<int:pk>/order/', views.create_order_view, name='create_order'),
+
+    # API
+    path('api/products/', api.products_api, name='api_products'),
+    path('api/suggest/', api.suggest_api, name='api_suggest'),
 ]
@@ -1,82 +1,129 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Min, Max
-from .models import Product, Category, Favorite
+from django.db.models import Min, Max
+from django.http import Http404
+from .models import Product, Favorite, SimilarProduct, heavy_fields
+from .brands import brand_facet
+from . import engine, popularity
+from .cache import CATALOG, cached
+from .categories import get_tree
+from .conditional import catalog_etag, conditional_page, product_etag, product_last_modified
+from .facets import get_facets
+from .fragments import SIMILAR_CARD_TEMPLATES, attach_card_html
+from .filters import filter_products, get_sort
+from .pagination import InvalidCursor, paginate
+
+
+def _user_favorites(request):
+    """id избранных продуктов текущего пользователя"""
+    if not request.user.is_authenticated:
+        return []
+    return list(Favorite.objects.filter(
+        user=request.user
+    ).values_list('product_id', flat=True))
+
+
+def _catalog_page(request):
+    """Текущая страница каталога и query string следующей страницы"""
+    sort = get_sort(request.GET)
+    cursor = request.GET.get('cursor')
+    try:
+        page = engine.paginate(request.GET, sort, cursor) if engine.is_enabled() else None
+        if page is None:
+            page = paginate(filter_products(request.GET), sort, cursor=cursor)
+    except InvalidCursor:
+        raise Http404('Некорректный курсор страницы')
+
+    # Готовые фрагменты карточек из кэша
+    attach_card_html(page.object_list)
+
+    next_query = None
+    if page.has_next:
+        params = request.GET.copy()
+        params['cursor'] = page.next_cursor
+        next_query = params.urlencode()
+    return page, next_query
+
+
+def _price_range():
+    """Диапазон цен доступных продуктов"""
+    return Product.objects.filter(is_available=True).aggregate(
+        min_price=Min('effective_price'),
+        max_price=Max('effective_price')
+    )
 
 
+@conditional_page(catalog_etag)
 def catalog_view(request):
     """Каталог продуктов с фильтрацией"""
-    products = Product.objects.filter(is_available=True).select_related('category').prefetch_related('images')
-
-    # Фильтры
-    category_filter = request.GET.get('category')
-    is_organic = request.GET.get('organic')
-    is_new = request.GET.get('new')
-    price_from = request.GET.get('price_from')
-    price_to = request.GET.get('price_to')
-    search_query = request.GET.get('search')
-
-    # Применение фильтров
-    if category_filter:
-        products = products.filter(category__slug=category_filter)
-
-    if is_organic:
-        products = products.filter(is_organic=True)
-
-    if is_new:
-        products = products.filter(is_new=True)
-
-    if price_from:
-        products = products.filter(price__gte=price_from)
-
-    if price_to:
-        products = products.filter(price__lte=price_to)
-
-    if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(brand__icontains=search_query) |
-            Q(category__name__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
-
-    # Сортировка
-    sort = request.GET.get('sort', '-created_at')
-    if sort in ['price', '-price', 'name', '-created_at']:
-        products = products.order_by(sort)
+    page, next_query = _catalog_page(request)
 
     # Данные для фильтров
-    categories = Category.objects.all().order_by('name')
-    price_range = Product.objects.filter(is_available=True).aggregate(
-        min_price=Min('price'),
-        max_price=Max('price')
-    )
-
-    # Избранное пользователя
-    user_favorites = []
-    if request.user.is_authenticated:
-        user_favorites = list(Favorite.objects.filter(
-            user=request.user
-        ).values_list('product_id', flat=True))
+    price_range = cached('catalog:price-range', [CATALOG], _price_range)
+
+    # Счётчики фасетов - одним запросом
+    facets = get_facets(request.GET)
+    categories = get_tree().sidebar(request.GET.get('category'), facets['categories'])
+    brands = brand_facet(facets['brands'], request.GET.get('brand'))
+    for brand in brands:
+        # Повторный выбор производителя снимает фильтр
+        params = request.GET.copy()
+        params.pop('cursor', None)
+        if params.get('brand') == brand.slug:
+            params.pop('brand')
+        else:
+            params['brand'] = brand.slug
+        brand.query = params.urlencode()
+    for bucket in facets['price_buckets']:
+        params = request.GET.copy()
+        params.pop('cursor', None)
+        params['price_from'] = bucket['price_from'] or ''
+        params['price_to'] = bucket['price_to'] or ''
+        bucket['query'] = params.urlencode()
 
     context = {
-        'products': products,
+        'products': page,
+        'products_count': facets['total'],
+        'facets': facets,
+        'next_query': next_query,
         'categories': categories,
+        'brands': brands,
         'price_range': price_range,
-        'user_favorites': user_favorites,
+        'user_favorites': _user_favorites(request),
         # Текущие фильтры
-        'current_category': category_filter,
-        'current_sort': sort,
+        'current_category': request.GET.get('category'),
+        'current_brand': request.GET.get('brand'),
+        'current_sort': get_sort(request.GET),
     }
 
     return render(request, 'products/catalog.html', context)
 
 
+@conditional_page(catalog_etag)
+def catalog_page_view(request):
+    """Фрагмент следующей страницы каталога для бесконечной прокрутки"""
+    page, next_query = _catalog_page(request)
+
+    context = {
+        'products': page,
+        'next_query': next_query,
+        'user_favorites': _user_favorites(request),
+    }
+
+    return render(request, 'products/includes/catalog_page.html', context)
+
+
+def _record_view(request, pk):
+    """Учесть просмотр - в том числе повторный, на который отдан 304"""
+    popularity.record_view(pk)
+
+
+@conditional_page(product_etag, product_last_modified, on_view=_record_view)
 def car_detail_view(request, pk):
     """Детальная страница продукта"""
     product = get_object_or_404(
-        Product.objects.select_related('category').prefetch_related('images'),
+        Product.objects.select_related('category', 'brand', 'main_image').prefetch_related('images'),
         pk=pk
     )
 
@@ -88,11 +135,20 @@ def car_detail_view(request, pk):
             product=product
         ).exists()
 
-    # Похожие продукты
-    similar_products = Product.objects.filter(
-        category=product.category,
-        is_available=True
-    ).exclude(pk=product.pk).select_related('category').prefetch_related('images')[:4]
+    # Похожие продукты: рассчитанные заранее (build_similar_products),
+    # а пока расчёта нет - из той же категории
+    similar_products = [
+        link.similar for link in SimilarProduct.objects.filter(
+            product=product,
+            similar__is_available=True
+        ).select_related('similar__category', 'similar__main_image').defer(*heavy_fields('similar__'))[:4]
+    ]
+    if not similar_products:
+        similar_products = Product.objects.filter(
+            category=product.category,
+            is_available=True
+        ).exclude(pk=product.pk).select_related('category', 'main_image').for_listing()[:4]
+    similar_products = attach_card_html(similar_products, SIMILAR_CARD_TEMPLATES)
 
     context = {
         'product': product,
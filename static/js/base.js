@@ -0,0 +1,70 @@
+function toggleUserMenu(event) {
+    event.stopPropagation();
+    const dropdown = document.getElementById('userDropdown');
+    dropdown.classList.toggle('show');
+}
+
+// Close dropdown when clicking outside
+document.addEventListener('click', function(event) {
+    const dropdown = document.getElementById('userDropdown');
+    if (dropdown && dropdown.classList.contains('show')) {
+        dropdown.classList.remove('show');
+    }
+    const suggest = document.getElementById('searchSuggest');
+    if (suggest && !event.target.closest('.navbar-search')) {
+        suggest.classList.remove('show');
+    }
+});
+
+// Подсказки поиска по мере ввода
+(function() {
+    const input = document.getElementById('searchInput');
+    const box = document.getElementById('searchSuggest');
+    let timer = null;
+    let lastQuery = '';
+
+    // Экранирует и кавычки: значения подставляются и в атрибуты
+    const HTML_ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'};
+
+    function escapeHtml(text) {
+        return String(text ?? '').replace(/[&<>"']/g, char => HTML_ESCAPES[char]);
+    }
+
+    function render(data) {
+        let html = '';
+        if (data.corrected) {
+            html += `<div class="suggest-hint">Возможно, вы искали: <strong>${escapeHtml(data.corrected)}</strong></div>`;
+        }
+        data.categories.forEach(item => {
+            html += `<a href="${escapeHtml(item.url)}" class="suggest-item">${escapeHtml(item.icon)} ${escapeHtml(item.name)}</a>`;
+        });
+        data.brands.forEach(item => {
+            html += `<a href="${escapeHtml(item.url)}" class="suggest-item suggest-brand">${escapeHtml(item.name)}</a>`;
+        });
+        data.products.forEach(item => {
+            html += `<a href="${escapeHtml(item.url)}" class="suggest-item">${escapeHtml(item.name)}</a>`;
+        });
+        box.innerHTML = html;
+        box.classList.toggle('show', html !== '');
+    }
+
+    input.addEventListener('input', function() {
+        const query = input.value.trim();
+        clearTimeout(timer);
+        if (query.length < 2) {
+            box.classList.remove('show');
+            return;
+        }
+        timer = setTimeout(function() {
+            lastQuery = query;
+            fetch(`${input.dataset.suggestUrl}?q=${encodeURIComponent(query)}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (query === lastQuery) {
+                        render(data);
+                    }
+                })
+                .catch(error => console.error('Error:', error));
+        }, 150);
+    });
+})();
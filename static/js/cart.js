@@ -0,0 +1,80 @@
+function updateQuantity(productId, change) {
+    const input = document.getElementById(`quantity-${productId}`);
+    const currentValue = parseInt(input.value);
+    const maxValue = parseInt(input.max);
+    const newValue = currentValue + change;
+
+    if (newValue >= 1 && newValue <= maxValue) {
+        updateQuantityDirect(productId, newValue);
+    }
+}
+
+// Изменения количества копятся и отправляются одним запросом
+const BATCH_DELAY = 400;
+const pendingQuantities = new Map();
+let batchTimer = null;
+
+function updateQuantityDirect(productId, quantity) {
+    document.getElementById(`quantity-${productId}`).value = quantity;
+    pendingQuantities.set(productId, parseInt(quantity));
+    clearTimeout(batchTimer);
+    batchTimer = setTimeout(sendQuantities, BATCH_DELAY);
+}
+
+function sendQuantities() {
+    const operations = Array.from(pendingQuantities, ([productId, quantity]) => ({
+        product_id: productId,
+        quantity: quantity
+    }));
+    pendingQuantities.clear();
+
+    fetch(document.getElementById('cart').dataset.batchUrl, {
+        method: 'POST',
+        body: JSON.stringify({operations: operations}),
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': document.querySelector('[name=csrfmiddlewaretoken]').value,
+            'X-Requested-With': 'XMLHttpRequest'
+        }
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (!data.success) {
+            // Количество не прошло проверку остатков - показываем сообщение и актуальную корзину
+            alert(data.errors ? data.errors.map(error => error.message).join('\n') : data.message);
+            location.reload();
+            return;
+        }
+
+        Object.entries(data.items).forEach(([productId, item]) => {
+            if (item.quantity > 0) {
+                // Обновляем цену позиции
+                document.getElementById(`item-total-${productId}`).textContent = Math.round(item.item_total) + ' ₽';
+                document.getElementById(`quantity-${productId}`).value = item.quantity;
+            } else {
+                // Удаляем элемент из DOM если количество 0
+                document.getElementById(`cart-item-${productId}`).remove();
+            }
+        });
+
+        // Если корзина пуста, перезагружаем страницу
+        if (data.cart_items_count === 0) {
+            location.reload();
+            return;
+        }
+
+        // Обновляем общую сумму
+        document.getElementById('cart-total-price').textContent = Math.round(data.cart_total) + ' ₽';
+        document.getElementById('cart-items-count').textContent = data.cart_items_count + ' шт';
+
+        // Итого с доставкой считает сервер
+        const finalTotal = document.getElementById('cart-final-total');
+        finalTotal.textContent = Math.round(data.cart_final_total) + ' ₽';
+
+        // Перезагружаем страницу если сумма перешла через порог минимального заказа (чтобы обновить UI)
+        if ((finalTotal.dataset.meetsMinimum === '1') !== data.meets_minimum) {
+            location.reload();
+        }
+    })
+    .catch(error => console.error('Error:', error));
+}
@@ -0,0 +1,92 @@
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== '') {
+        const cookies = document.cookie.split(';');
+        for (let i = 0; i < cookies.length; i++) {
+            const cookie = cookies[i].trim();
+            if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
+            }
+        }
+    }
+    return cookieValue;
+}
+
+// Бесконечная прокрутка: подгружаем следующую страницу, когда блок
+// «Показать ещё» появляется в зоне видимости
+(function() {
+    const grid = document.getElementById('catalogGrid');
+    const more = document.getElementById('catalogMore');
+    if (!grid || !more || !('IntersectionObserver' in window)) {
+        return;
+    }
+
+    let loading = false;
+    const observer = new IntersectionObserver(function(entries) {
+        if (!entries[0].isIntersecting || loading) {
+            return;
+        }
+        loading = true;
+
+        fetch(more.dataset.nextUrl, {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+            .then(response => response.text())
+            .then(html => {
+                const fragment = document.createElement('template');
+                fragment.innerHTML = html;
+
+                const next = fragment.content.querySelector('.catalog-more');
+                if (next) {
+                    next.remove();
+                }
+                grid.appendChild(fragment.content);
+
+                if (next) {
+                    more.dataset.nextUrl = next.dataset.nextUrl;
+                    more.querySelector('a').href = '?' + next.dataset.nextUrl.split('?')[1];
+                    loading = false;
+                } else {
+                    observer.disconnect();
+                    more.remove();
+                }
+            })
+            .catch(error => {
+                console.error('Error:', error);
+                loading = false;
+            });
+    }, {rootMargin: '400px'});
+
+    observer.observe(more);
+})();
+
+function toggleFavorite(button, productId) {
+    const csrftoken = getCookie('csrftoken');
+
+    fetch(`/accounts/toggle-favorite/${productId}/`, {
+        method: 'POST',
+        headers: {
+            'X-CSRFToken': csrftoken,
+            'X-Requested-With': 'XMLHttpRequest',
+            'Content-Type': 'application/json'
+        }
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            // Update button icon
+            const svg = button.querySelector('svg');
+            if (data.is_favorite) {
+                // Set to filled heart
+                svg.setAttribute('fill', 'red');
+                svg.setAttribute('stroke', 'red');
+            } else {
+                // Set to empty heart
+                svg.setAttribute('fill', 'none');
+                svg.setAttribute('stroke', 'currentColor');
+            }
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+    });
+}
@@ -0,0 +1,41 @@
+function changeQuantity(delta) {
+    const input = document.getElementById('quantity');
+    const current = parseInt(input.value) || 1;
+    const min = parseInt(input.min) || 1;
+    const max = parseInt(input.max) || 999;
+    const newValue = current + delta;
+
+    if (newValue >= min && newValue <= max) {
+        input.value = newValue;
+    }
+}
+
+function toggleFavorite(productId) {
+    const csrftoken = document.querySelector('[name=csrfmiddlewaretoken]').value;
+    const btn = document.getElementById('favoriteBtn');
+
+    fetch(`/accounts/toggle-favorite/${productId}/`, {
+        method: 'POST',
+        headers: {
+            'X-CSRFToken': csrftoken,
+            'X-Requested-With': 'XMLHttpRequest',
+            'Content-Type': 'application/json'
+        }
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            const svg = btn.querySelector('svg');
+            if (data.is_favorite) {
+                svg.setAttribute('fill', 'var(--color-accent)');
+                svg.setAttribute('stroke', 'var(--color-accent)');
+                btn.classList.add('favorited');
+            } else {
+                svg.setAttribute('fill', 'none');
+                svg.setAttribute('stroke', 'currentColor');
+                btn.classList.remove('favorited');
+            }
+        }
+    })
+    .catch(error => console.error('Error:', error));
+}